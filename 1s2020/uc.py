@@ -8,11 +8,23 @@
 # the compiler proper.
 # ============================================================
 
+import os
 import sys
+import mmap
 import argparse
+import tempfile
+import ply
+import uc_lexer
+import uc_parser
+import uc_ast2
+import uc_sema
+import uc_cache
 from contextlib import contextmanager
 from uc_parser import UCParser
-from uc_sema import Visitor
+from uc_sema import Visitor, SemanticError
+from uc_cache import source_hash, store, fetch, prune, trim
+from uc_ast2 import Program, FuncDef, GlobalDecl
+from uc_block2 import CFG, write_code
 from uc_code2 import GenerateCode
 from uc_interpreter import Interpreter
 from uc_llvm import LLVMCodeGenerator
@@ -114,13 +126,24 @@ def subscribe_errors(handler):
         _subscribers.remove(handler)
 
 
+# Version of the front end: checked programs cached by an older parser or
+# semantic analysis are never loaded, and are removed from the cache.
+_front_end = source_hash(*(m.__file__ for m in (uc_lexer, uc_parser, uc_ast2, uc_sema, uc_cache)),
+                         extra=ply.__version__ + sys.version)
+
+# Bytes of checked programs kept in the cache; the least recently used
+# ones are removed past it. UC_CACHE_SIZE sets it in megabytes.
+_cache_quota = int(os.environ.get('UC_CACHE_SIZE') or 256) << 20
+
+
 class Compiler:
     """ This object encapsulates the compiler and serves as a
         facade interface to the 'meat' of the compiler underneath.
     """
 
-    def __init__(self, cl_args):
+    def __init__(self, cl_args, parser=None):
         self.code = None
+        self.parser = parser
         self.total_errors = 0
         self.total_warnings = 0
         self.args = cl_args
@@ -129,26 +152,67 @@ class Compiler:
         """ Parses the source code. If ast_file != None,
             prints out the abstract syntax tree.
         """
-        self.parser = UCParser()
-        self.ast = self.parser.parse(self.code, '', False)
+        if self.parser is None:
+            self.parser = UCParser(engine='scanner' if self.args.scanner or self.args.mmap else 'ply')
+        if self.args.mmap:
+            self.ast = self.parser.parse_file(self.filename, False)
+        elif self.args.jobs > 1:
+            self.ast = self.parser.parse_parallel(self.code, '', False, self.args.jobs)
+        else:
+            self.ast = self.parser.parse(self.code, '', False)
 
     def _sema(self):
         """ Decorate AST with semantic actions. If ast_file != None,
             prints out the abstract syntax tree. """
         try:
-            self.sema = Visitor(self.args.debug)
+            self.sema = Visitor(self.args.debug, self._sema_errors())
             self.sema.visit(self.ast)
-            if not self.args.susy and self.ast_file is not None:
-                self.ast.show(buf=self.ast_file, showcoord=True)
-        except AssertionError as e:
+            if not errors_reported():
+                self._dump_ast()
+        except SemanticError as e:
             error(None, e)
 
+    def _sema_errors(self):
+        """ Returns the function that semantic analysis passes its errors
+            to with --all-errors, to go on checking after each one, or None
+            to stop at the first one. """
+        if self.args.all_errors:
+            return lambda e: error(None, e)
+        return None
+
+    def _load(self):
+        """ Loads the AST that a previous run checked for the same source
+            and front end from the cache. Returns False on a miss.
+        """
+        self.ast = fetch(self.cache_entry)
+        if self.ast is None:
+            return False
+        self._dump_ast()
+        return True
+
+    def _dump_ast(self):
+        """ Writes the checked AST to ast_file, if any, as text or as
+            JSON Lines. """
+        if not self.args.susy and self.ast_file is not None:
+            if self.args.ast_format == 'jsonl':
+                uc_ast2.dump_jsonl(self.ast, self.ast_file)
+            else:
+                uc_ast2.dump(self.ast, self.ast_file, showcoord=True)
+
+    def _store(self):
+        """ Caches the checked AST, before code generation decorates it,
+            and removes the entries of other front ends and those past the
+            quota. """
+        if store(self.cache_entry, self.ast):
+            prune('ast_', 'ast_' + _front_end)
+            trim('ast_', _cache_quota)
+
     def _codegen(self):
         self.gen = GenerateCode(self.args.cfg)
         self.gen.visit(self.ast)
         self.gencode = self.gen.code
-        # if not self.args.susy and self.ir_file is not None:
-        #     self.gen.show(buf=self.ir_file)
+        if not self.args.susy and self.ir_file is not None:
+            self.gen.show(buf=self.ir_file)
 
     def _opt(self):
         self.optcode = "Test"
@@ -161,11 +225,129 @@ class Compiler:
         # if self.run:
         #     self.llvm.execute_ir(self.args.llvm_opt, self.llvm_opt_file)
 
+    def _stream(self):
+        """ Compiles the source one top-level declaration at a time: each
+            one is parsed, checked, dumped and lowered to uCIR as soon as
+            the declarations before it are, and the body and CFG of each
+            function are dropped once its uCIR is emitted, so the memory
+            used grows with the largest function instead of with the whole
+            program. The uCIR of the functions is spooled to a temporary
+            file and written after the global text, in the order _codegen()
+            writes it. Returns False, with nothing written, if the source
+            has to be compiled as a whole instead (see parse_items()).
+            With --mmap the items are parsed from a memory map of the file.
+        """
+        if self.parser is None:
+            self.parser = UCParser(engine='scanner' if self.args.scanner or self.args.mmap else 'ply')
+        if self.code is not None:
+            return self._stream_code(self.code)
+        with open(self.filename, 'rb') as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                return self._stream_code(b'')
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as code:
+                return self._stream_code(code)
+
+    def _stream_code(self, code):
+        """ Compiles code, the text or the bytes of the source, for
+            _stream(). """
+        self.sema = Visitor(self.args.debug, self._sema_errors())
+        self.gen = GenerateCode(self.args.cfg)
+        self.gencode = None
+        environment = self.sema.environment
+        program = Program([])
+        environment.push(program)
+        program.symtab = environment.get_root()
+        dump = not self.args.susy and self.ast_file is not None
+        if dump:
+            if self.args.ast_format == 'jsonl':
+                next_id = uc_ast2.dump_jsonl(program, self.ast_file)
+            else:
+                uc_ast2.dump(program, self.ast_file, showcoord=True)
+
+        # A function is an offset range of the spool; a global declaration
+        # is None, as its uCIR is the global block of the whole program.
+        segments = []
+        failed = False
+        with tempfile.TemporaryFile('w+') as spool:
+            for index, decl in enumerate(self.parser.parse_items(code, '', False)):
+                if decl is None:
+                    self._discard_ast()
+                    return False
+                errors = errors_reported()
+                try:
+                    self.sema.visit(decl)
+                except SemanticError as e:
+                    self._discard_ast()
+                    error(None, e)
+                    return True
+                # With --all-errors the declarations after one with errors
+                # are only checked.
+                if failed or errors_reported() != errors:
+                    if not failed:
+                        self._discard_ast()
+                        failed = True
+                    continue
+                if dump:
+                    if self.args.ast_format == 'jsonl':
+                        next_id = uc_ast2.dump_jsonl(decl, self.ast_file, next_id, 0, 'gdecls[%d]' % index)
+                    else:
+                        uc_ast2.dump(decl, self.ast_file, offset=4, showcoord=True)
+                self.gen.visit(decl)
+                if isinstance(decl, FuncDef):
+                    start = spool.tell()
+                    write_code(self.gen.emit(decl), spool)
+                    segments.append((start, spool.tell()))
+                    if self.args.cfg:
+                        CFG(decl.decl.name.name).view(decl.cfg)
+                    decl.body = decl.decls = decl.cfg = None
+                else:
+                    segments.append(None)
+                self.gen.code = []
+            environment.pop()
+            if failed:
+                return True
+
+            glob = self.gen.globalBlock
+            if glob.instructions:
+                segments.append(None)
+                if self.args.cfg:
+                    CFG(glob.label).view(glob)
+            if not self.args.susy and self.ir_file is not None:
+                write_code(self.gen.text, self.ir_file)
+                glob_code = self.gen.emit(GlobalDecl(None, cfg=glob)) if glob.instructions else []
+                for segment in segments:
+                    if segment is None:
+                        write_code(glob_code, self.ir_file)
+                    else:
+                        start, end = segment
+                        spool.seek(start)
+                        self._copy(spool, self.ir_file, end - start)
+        return True
+
+    @staticmethod
+    def _copy(src, dst, size):
+        """ Copies size characters from src to dst, a block at a time. """
+        while size > 0:
+            block = src.read(min(size, 1 << 20))
+            if not block:
+                break
+            dst.write(block)
+            size -= len(block)
+
+    def _discard_ast(self):
+        """ Empties ast_file of a partial dump. """
+        if not self.args.susy and self.ast_file is not None:
+            self.ast_file.seek(0)
+            self.ast_file.truncate()
+
     def _do_compile(self):
         """ Compiles the code to the given source file. """
-        self._parse()
-        if not errors_reported():
-            self._sema()
+        if not self.cache_entry or not self._load():
+            self._parse()
+            if not errors_reported():
+                self._sema()
+            if self.cache_entry and not errors_reported():
+                self._store()
         if not errors_reported():
             self._codegen()
             if self.args.opt:
@@ -185,9 +367,9 @@ class Compiler:
 
         self.ast_file = None
         if self.args.ast and not self.args.susy:
-            ast_filename = filename[:-3] + '.ast'
+            ast_filename = filename[:-3] + ('.ast.jsonl' if self.args.ast_format == 'jsonl' else '.ast')
             sys.stderr.write("Outputting the AST to %s.\n" % ast_filename)
-            self.ast_file = open(ast_filename, 'w')
+            self.ast_file = open(ast_filename, 'w', buffering=1 << 20)
             open_files.append(self.ast_file)
 
         self.ir_file = None
@@ -218,13 +400,24 @@ class Compiler:
             self.llvm_opt_file = open(llvm_opt_filename, 'w')
             open_files.append(self.llvm_opt_file)
 
-        source = open(filename, 'r')
-        self.code = source.read()
-        source.close()
+        self.filename = filename
+        self.cache_entry = None
+        if self.args.cache and not self.args.debug:
+            mode = 'mmap' if self.args.mmap else 'text'
+            self.cache_entry = 'ast_%s_%s' % (_front_end, source_hash(filename, extra=mode))
+        if not self.args.mmap:
+            source = open(filename, 'r')
+            self.code = source.read()
+            source.close()
 
         self.run = not self.args.no_run
+        stream = self.args.stream
+        if stream and (self.args.llvm or self.args.opt):
+            sys.stderr.write("--stream is ignored with --llvm and --opt, which need the whole program.\n")
+            stream = False
         with subscribe_errors(lambda msg: sys.stderr.write(msg+"\n")):
-            self._do_compile()
+            if not stream or not self._stream():
+                self._do_compile()
             if errors_reported():
                 sys.stderr.write("{} error(s) encountered.".format(errors_reported()))
             elif not self.args.llvm:
@@ -249,10 +442,24 @@ if __name__ == '__main__':
     parser.add_argument("filename")
     parser.add_argument("-s", "--susy", help="run in the susy machine", action='store_true')
     parser.add_argument("-a", "--ast", help="dump the AST in the 'filename'.ast", action='store_true')
+    parser.add_argument("--ast-format", choices=['text', 'jsonl'], default='text',
+                        help="dump the AST as indented text or as JSON Lines in 'filename'.ast.jsonl")
     parser.add_argument("-i", "--ir", help="dump the uCIR in the 'filename'.ir", action='store_true')
     parser.add_argument("-n", "--no-run", help="do not execute the program", action='store_true')
     parser.add_argument("-c", "--cfg", help="show the CFG for each function in pdf format", action='store_true')
     parser.add_argument("-o", "--opt", help="optimize the uCIR with const prop and dce", action='store_true')
+    parser.add_argument("-x", "--scanner", help="lex with the precompiled scanner instead of PLY's lexer",
+                        action='store_true')
+    parser.add_argument("-m", "--mmap", help="lex the source from a memory map of the file (implies --scanner)",
+                        action='store_true')
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="parse the top-level declarations in this many processes")
+    parser.add_argument("--stream", action='store_true',
+                        help="check and lower the program one function at a time, releasing each after emitting it")
+    parser.add_argument("--all-errors", action='store_true',
+                        help="report every semantic error instead of stopping at the first one")
+    parser.add_argument("--cache", action='store_true',
+                        help="cache the checked AST, and load it instead of parsing and checking the same source again")
     parser.add_argument("-d", "--debug", help="print in the stderr some debug informations", action='store_true')
     parser.add_argument("-l", "--llvm", help="generate LLVM IR code in the 'filename'.ll", action='store_true')
     parser.add_argument("-p", "--llvm-opt", choices=['ctm', 'dce', 'cfg', 'all'],
@@ -1,4 +1,8 @@
 import sys
+import json
+from array import array
+from hashlib import blake2b
+from reprlib import recursive_repr
 
 
 def _repr(obj):
@@ -11,29 +15,519 @@ def _repr(obj):
         return repr(obj)
 
 
-class Node(object):
-    __slots__ = ()
-    """ Abstract base class for AST nodes.
+def _node_repr(node, names):
+    result = node.__class__.__name__ + '('
+
+    indent = ''
+    separator = ''
+    for name in names:
+        result += separator
+        result += indent
+        result += name + '=' + (_repr(getattr(node, name)).replace('\n', '\n  ' + (' ' * (len(name) + len(node.__class__.__name__)))))
+
+        separator = ','
+        indent = '\n ' + (' ' * len(node.__class__.__name__))
+
+    result += '  )'
+
+    return result
+
+
+def walk(node, pre=None, post=None, name=None):
+    """ Depth-first walk over node and its children, using an explicit
+        stack instead of recursion so that deeply nested trees do not
+        hit the recursion limit.
+            pre:
+                Called as pre(node, name, depth) before the children of
+                node. If it returns False the children are skipped.
+            post:
+                Called as post(node, name, depth) after the children.
+        name is the name of node within its parent and depth counts from
+        0 at the starting node.
+    """
+    stack = [(node, name, 0, False)]
+    while stack:
+        node, name, depth, done = stack.pop()
+        if done:
+            post(node, name, depth)
+            continue
+        if pre is not None and pre(node, name, depth) is False:
+            continue
+        if post is not None:
+            stack.append((node, name, depth, True))
+        for slot in reversed(node.child_slots):
+            child = getattr(node, slot)
+            if child is None:
+                continue
+            if slot in node.list_slots:
+                for i in range(len(child) - 1, -1, -1):
+                    if child[i] is not None:
+                        stack.append((child[i], "%s[%d]" % (slot, i), depth + 1, False))
+            else:
+                stack.append((child, slot, depth + 1, False))
+
+
+# Number of characters the dumps gather before each write to their buffer.
+_dump_chunk = 1 << 18
+
+
+def dump(node, buf, offset=0, attrnames=False, nodenames=False, showcoord=False, name=None):
+    """ Writes the text of node.show() to buf. The tree is walked with an
+        explicit stack, each line is built as one string, coordinates are
+        formatted straight from their packed integer, and the lines are
+        written in chunks of about _dump_chunk characters.
+    """
+    lines = []
+    size = 0
+    shift, mask = Coord._column_bits, Coord._column_mask
+    stack = [(node, name, offset)]
+    while stack:
+        node, name, lead = stack.pop()
+        line = ' ' * lead + node.__class__.__name__
+        if nodenames and name is not None:
+            line += ' <' + name + '>: '
+        else:
+            line += ': '
+        names = node.attr_names
+        if names:
+            if attrnames:
+                nvlist = [(n, getattr(node, n)) for n in names if getattr(node, n) is not None]
+                line += ', '.join('%s=%s' % nv for nv in nvlist)
+            elif len(names) == 1:
+                line += '%s' % (getattr(node, names[0]),)
+            else:
+                line += ', '.join('%s' % (getattr(node, n),) for n in names)
+        if showcoord:
+            coord = node.coord
+            if coord and coord >> shift:
+                line += '   @ %d:%d' % (coord >> shift, coord & mask)
+        lines.append(line)
+        size += len(line)
+        if size >= _dump_chunk:
+            buf.write('\n'.join(lines) + '\n')
+            lines.clear()
+            size = 0
+
+        lead += 4
+        lists = node.list_slots
+        for slot in reversed(node.child_slots):
+            child = getattr(node, slot)
+            if child is None:
+                continue
+            if lists and slot in lists:
+                for i in range(len(child) - 1, -1, -1):
+                    if child[i] is not None:
+                        stack.append((child[i], nodenames and "%s[%d]" % (slot, i), lead))
+            else:
+                stack.append((child, slot, lead))
+    if lines:
+        buf.write('\n'.join(lines) + '\n')
+
+
+def _json_value(value):
+    """ Returns value as plain data for json: nodes become the dict of
+        their kind and shown attributes, other objects their str().
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    if isinstance(value, (Node, NodeView)):
+        fields = {'kind': value.__class__.__name__}
+        for n in value.attr_names:
+            fields[n] = _json_value(getattr(value, n))
+        return fields
+    return str(value)
+
+
+def dump_jsonl(node, buf, first=0, parent=None, slot=None):
+    """ Writes the tree under node to buf as JSON Lines: one object per
+        node, in preorder, so a reader can process the dump as it streams
+        in. Each object has the 'id' of the node (its preorder index), the
+        'parent' id and 'slot' it hangs from (absent for the root), its
+        'kind', its 'coord' as [line, column] when it has a line, its shown
+        attributes under 'attrs' and, once checked, the names of its
+        'type'.
+
+        A tree can be written in parts: first is the id of node, and
+        parent and slot place it under a node written before. Returns the
+        id that follows the last node written.
+    """
+    lines = []
+    size = 0
+    count = first
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    shift, mask = Coord._column_bits, Coord._column_mask
+    stack = [(node, slot, parent)]
+    while stack:
+        node, slot, parent = stack.pop()
+        index = count
+        count += 1
+        if parent is None:
+            line = '{"id":%d,"kind":"%s"' % (index, node.__class__.__name__)
+        else:
+            line = '{"id":%d,"parent":%d,"slot":"%s","kind":"%s"' % (index, parent, slot, node.__class__.__name__)
+        coord = node.coord
+        if coord and coord >> shift:
+            line += ',"coord":[%d,%d]' % (coord >> shift, coord & mask)
+        if node.attr_names:
+            line += ',"attrs":' + encode({n: _json_value(getattr(node, n)) for n in node.attr_names})
+        if 'type' not in node.child_slots:
+            names = getattr(getattr(node, 'type', None), 'names', None)
+            if isinstance(names, list):
+                line += ',"type":' + encode([str(n) for n in names])
+        lines.append(line + '}')
+        size += len(line)
+        if size >= _dump_chunk:
+            buf.write('\n'.join(lines) + '\n')
+            lines.clear()
+            size = 0
+
+        lists = node.list_slots
+        for slot in reversed(node.child_slots):
+            child = getattr(node, slot)
+            if child is None:
+                continue
+            if lists and slot in lists:
+                for i in range(len(child) - 1, -1, -1):
+                    if child[i] is not None:
+                        stack.append((child[i], "%s[%d]" % (slot, i), index))
+            else:
+                stack.append((child, slot, index))
+    if lines:
+        buf.write('\n'.join(lines) + '\n')
+    return count
+
+
+def _push_children(stack, node):
+    """ Pushes the children of node on stack, the first one last. """
+    for slot in reversed(node.child_slots):
+        child = getattr(node, slot)
+        if child is None:
+            continue
+        if slot in node.list_slots:
+            stack.extend(item for item in reversed(child) if item is not None)
+        else:
+            stack.append(child)
+
+
+class NodeIndex(object):
+    """ Index of the nodes of a tree by kind (class name), and of its ID
+        nodes by name, so that a pass can go straight to every FuncCall or
+        to every use of a variable instead of walking the whole tree. A
+        node held by several parents (the Types that semantic analysis
+        shares) is indexed once, and stays indexed until it was discarded
+        as many times as it was added.
+
+        The index only sees the changes made through it: rewrite an indexed
+        tree with replace(), insert() and remove(), or add() and discard()
+        the subtrees linked in or out by hand. The name of an indexed ID
+        must not change.
     """
 
+    def __init__(self, root=None):
+        self._kinds = {}
+        self._uses = {}
+        self._counts = {}
+        if root is not None:
+            self.add(root)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, node):
+        return id(node) in self._counts
+
     def __repr__(self):
-        """ Generates a python representation of the current node
+        return "NodeIndex(%d nodes)" % len(self)
+
+    def __getstate__(self):
+        # The index is keyed by id(), which does not survive pickling.
+        return [(node, self._counts[key]) for nodes in self._kinds.values() for key, node in nodes.items()]
+
+    def __setstate__(self, state):
+        self.__init__()
+        for node, count in state:
+            self._register(node)
+            self._counts[id(node)] = count
+
+    def kinds(self):
+        """ Returns the names of the kinds of node indexed. """
+        return [kind for kind, nodes in self._kinds.items() if nodes]
+
+    def nodes(self, kind):
+        """ Returns the nodes of kind, a Node class or its name, in the
+            order they were indexed.
+        """
+        if isinstance(kind, type):
+            kind = kind.__name__
+        return list(self._kinds.get(kind, {}).values())
+
+    def uses(self, name):
+        """ Returns the ID nodes named name, in the order they were indexed. """
+        return list(self._uses.get(name, {}).values())
+
+    def _register(self, node):
+        key = id(node)
+        kind = node.__class__.__name__
+        self._kinds.setdefault(kind, {})[key] = node
+        if kind == 'ID':
+            self._uses.setdefault(node.name, {})[key] = node
+
+    def add(self, node):
+        """ Indexes node and the nodes below it. """
+        counts, kinds, uses = self._counts, self._kinds, self._uses
+        stack = [node]
+        pop, push, extend = stack.pop, stack.append, stack.extend
+        while stack:
+            node = pop()
+            key = id(node)
+            if key in counts:
+                counts[key] += 1
+                continue
+            counts[key] = 1
+            cls = node.__class__
+            kind = cls.__name__
+            nodes = kinds.get(kind)
+            if nodes is None:
+                nodes = kinds[kind] = {}
+            nodes[key] = node
+            if kind == 'ID':
+                uses.setdefault(node.name, {})[key] = node
+            lists = cls.list_slots
+            for slot in reversed(cls.child_slots):
+                child = getattr(node, slot)
+                if child is None:
+                    continue
+                if lists and slot in lists:
+                    extend(item for item in reversed(child) if item is not None)
+                else:
+                    push(child)
+
+    def discard(self, node):
+        """ Drops node and the nodes below it from the index. """
+        counts = self._counts
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            key = id(node)
+            if key not in counts:
+                continue
+            counts[key] -= 1
+            if counts[key]:
+                continue
+            del counts[key]
+            kind = node.__class__.__name__
+            del self._kinds[kind][key]
+            if kind == 'ID':
+                del self._uses[node.name][key]
+            _push_children(stack, node)
+
+    def replace(self, parent, slot, node):
+        """ Puts node in the child slot of parent, named as children()
+            names it ('expr', 'block_items[2]'), and re-indexes the
+            subtree it held. Returns the old child.
+        """
+        name, _, i = slot.partition('[')
+        if i:
+            items, i = getattr(parent, name), int(i[:-1])
+            old = items[i]
+            items[i] = node
+        else:
+            old = getattr(parent, name)
+            setattr(parent, name, node)
+        if old is not None:
+            self.discard(old)
+        if node is not None:
+            self.add(node)
+        return old
+
+    def insert(self, parent, slot, node, position=None):
+        """ Inserts node in the list slot of parent, at position or at
+            its end, and indexes it.
+        """
+        items = getattr(parent, slot)
+        if items is None:
+            items = []
+            setattr(parent, slot, items)
+        items.insert(len(items) if position is None else position, node)
+        self.add(node)
+
+    def remove(self, parent, slot, position):
+        """ Removes the node at position from the list slot of parent and
+            drops it from the index. Returns the node.
         """
-        result = self.__class__.__name__ + '('
+        node = getattr(parent, slot).pop(position)
+        if node is not None:
+            self.discard(node)
+        return node
 
-        indent = ''
-        separator = ''
-        for name in self.__slots__[:-1]:
-            result += separator
-            result += indent
-            result += name + '=' + (_repr(getattr(self, name)).replace('\n', '\n  ' + (' ' * (len(name) + len(self.__class__.__name__)))))
 
-            separator = ','
-            indent = '\n ' + (' ' * len(self.__class__.__name__))
+def index_of(program):
+    """ Returns the NodeIndex of program, building it on first use. Once
+        built it is kept in program.node_index, and passes that rewrite the
+        tree must keep it up to date (see NodeIndex).
+    """
+    if program.node_index is None:
+        program.node_index = NodeIndex(program)
+    return program.node_index
+
+
+def _hash_value(value, hashes):
+    """ Returns the bytes that stand for an attribute in a node's hash. """
+    if isinstance(value, Node):
+        return hashes[id(value)]
+    if isinstance(value, list):
+        return b'[' + b','.join(b'-' if item is None else _hash_value(item, hashes) for item in value) + b']'
+    typename = getattr(value, 'typename', None)
+    if typename is not None:
+        return typename.encode('utf-8')
+    return repr(value).encode('utf-8')
+
+
+def structural_hash(node, hashes=None):
+    """ Returns the Merkle hash of the tree under node, as 16 bytes: the
+        digest of the kind of node, its shown attributes and, slot by
+        slot, the hashes of its children. Coordinates are left out, so a
+        subtree hashes the same wherever it is in the source and from one
+        run to the next. Pass a dict as hashes to keep the hash of every
+        node under node, by id(node); nodes already in it are not hashed
+        again.
+
+        Hash trees as parse() returns them: semantic analysis converts the
+        types and values of constants in place.
+    """
+    if hashes is None:
+        hashes = {}
+    root = node
+    stack = [(node, None)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, values = pop()
+        cls = node.__class__
+        if values is None:
+            if id(node) in hashes:
+                continue
+            values = [getattr(node, name) for name in cls.attr_names]
+            values.extend(getattr(node, slot) for slot in cls.child_slots)
+            push((node, values))
+            for value in values:
+                if isinstance(value, Node):
+                    push((value, None))
+                elif value.__class__ is list:
+                    for item in value:
+                        if isinstance(item, Node):
+                            push((item, None))
+            continue
+        parts = [cls.__name__.encode('utf-8')]
+        for value in values:
+            if value is None:
+                parts.append(b'-')
+            elif isinstance(value, Node):
+                parts.append(hashes[id(value)])
+            else:
+                parts.append(_hash_value(value, hashes))
+        hashes[id(node)] = blake2b(b'\0'.join(parts), digest_size=16).digest()
+    return hashes[id(root)]
+
+
+class DeclSummary(object):
+    """ What incremental compilation needs to know of a FuncDef or a
+        GlobalDecl of a Program (see summarize()):
+            - decl: the declaration
+            - names: the names it declares
+            - hash: the structural_hash() of decl, in hex
+            - signature: the hex hash of what other declarations see of
+              it: the whole GlobalDecl, or the type and declarator of a
+              FuncDef without its body
+            - globals: the global variables a FuncDef refers to
+            - callees: the functions a FuncDef calls or refers to
+        The dependencies are found by name, so a global shadowed by a local
+        of the same name may be counted as used.
+    """
+    __slots__ = ('decl', 'names', 'hash', 'signature', 'globals', 'callees')
 
-        result += '  )'
+    def __init__(self, decl, names, hash, signature, globals=frozenset(), callees=frozenset()):
+        self.decl = decl
+        self.names = names
+        self.hash = hash
+        self.signature = signature
+        self.globals = globals
+        self.callees = callees
+
+    def __repr__(self):
+        return "DeclSummary(%s, %s)" % (', '.join(self.names), self.hash)
 
-        return result
+
+def _declared_names(decl):
+    """ Returns the (name, is_function) pairs a top-level decl declares. """
+    if isinstance(decl, FuncDef):
+        return [(decl.decl.name.name, True)]
+    return [(d.name.name, isinstance(d.type, FuncDecl)) for d in decl.decls or []
+            if isinstance(d, Decl) and d.name is not None]
+
+
+def summarize(program, hashes=None):
+    """ Returns the DeclSummary of each FuncDef and GlobalDecl of program,
+        in order. hashes is passed on to structural_hash().
+    """
+    if hashes is None:
+        hashes = {}
+    functions, variables = set(), set()
+    for decl in program.gdecls:
+        if isinstance(decl, (FuncDef, GlobalDecl)):
+            for name, is_function in _declared_names(decl):
+                (functions if is_function else variables).add(name)
+
+    summaries = []
+    for decl in program.gdecls:
+        if not isinstance(decl, (FuncDef, GlobalDecl)):
+            continue
+        names = tuple(name for name, _ in _declared_names(decl))
+        digest = structural_hash(decl, hashes).hex()
+        if isinstance(decl, GlobalDecl):
+            summaries.append(DeclSummary(decl, names, digest, digest))
+            continue
+        signature = blake2b(b'\0'.join(b'-' if part is None else structural_hash(part, hashes)
+                                        for part in (decl.spec, decl.decl)), digest_size=16).hexdigest()
+        used, called = set(), set()
+        stack = [decl.body]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if node.__class__ is ID:
+                used.add(node.name)
+            elif node.__class__ is FuncCall and isinstance(node.name, ID):
+                called.add(node.name.name)
+            _push_children(stack, node)
+        summaries.append(DeclSummary(decl, names, digest, signature, frozenset(used & variables),
+                                     frozenset((used | called) & functions)))
+    return summaries
+
+
+class Node(object):
+    __slots__ = ()
+    """ Abstract base class for AST nodes. The node classes are generated
+        from uc_ast2.cfg, see uc_astgen.py.
+
+        attr_names holds the attributes shown by show(), child_slots the
+        attributes holding children, in order, and list_slots those of
+        them that hold a list of children. Walking the child_slots with
+        getattr() visits the children without building children().
+    """
+
+    attr_names = ()
+    child_slots = ()
+    list_slots = ()
+
+    @recursive_repr()
+    def __repr__(self):
+        """ Generates a python representation of the current node.
+            Checked trees link back to their declarations, so a node
+            met again inside its own repr is written as '...'.
+        """
+        return _node_repr(self, self.__slots__[:-1])
 
     def children(self):
         """ A sequence of all children that are Nodes
@@ -42,7 +536,7 @@ class Node(object):
 
     def show(self, buf=sys.stdout, offset=0, attrnames=False, nodenames=False, showcoord=False, _my_node_name=None):
         """ Pretty print the Node and all its attributes and
-            children (recursively) to a buffer.
+            children to a buffer.
             buf:
                 Open IO buffer into which the Node is printed.
             offset:
@@ -57,50 +551,43 @@ class Node(object):
                 Do you want the coordinates of each Node to be
                 displayed.
         """
-        lead = ' ' * offset
-        if nodenames and _my_node_name is not None:
-            buf.write(lead + self.__class__.__name__ + ' <' + _my_node_name + '>: ')
-        else:
-            buf.write(lead + self.__class__.__name__ + ': ')
+        dump(self, buf, offset, attrnames, nodenames, showcoord, _my_node_name)
 
-        if self.attr_names:
-            if attrnames:
-                nvlist = [(n, getattr(self, n)) for n in self.attr_names if getattr(self, n) is not None]
-                attrstr = ', '.join('%s=%s' % nv for nv in nvlist)
-            else:
-                vlist = [getattr(self, n) for n in self.attr_names]
-                # vlist = [getattr(self, n) for n in self.attr_names[:-1]]
-                attrstr = ', '.join('%s' % v for v in vlist)
 
-            buf.write(attrstr)
-
-        if showcoord:
-            if self.coord:
-                buf.write('%s' % self.coord)
-        buf.write('\n')
-
-        for (child_name, child) in self.children():
-            # print("Dentro da AST, printando child:")
-            # print(child)
-            child.show(
-                buf,
-                offset=offset + 4,
-                attrnames=attrnames,
-                nodenames=nodenames,
-                showcoord=showcoord,
-                _my_node_name=child_name)
-
-
-class Coord(object):
-    """ Coordinates of a syntactic element. Consists of:
-            - Line number
-            - (optional) column number, for the Lexer
+class Coord(int):
+    """ Coordinates of a syntactic element, packed into a single integer:
+            - Line number, in the high bits
+            - (optional) column number, for the Lexer, in the low bits
+        The text is only formatted when a message or a dump asks for it.
+        Columns past the largest one the low bits hold are saturated to
+        it, so that they never spill into the line number.
     """
-    __slots__ = ('line', 'column')
+    __slots__ = ()
+
+    _column_bits = 32
+    _column_mask = (1 << _column_bits) - 1
+
+    def __new__(cls, line, column=None):
+        if column is None:
+            column = 0
+        elif column > cls._column_mask:
+            column = cls._column_mask
+        return int.__new__(cls, (line << cls._column_bits) | column)
 
-    def __init__(self, line, column=None):
-        self.line = line
-        self.column = column
+    @property
+    def line(self):
+        return self >> self._column_bits
+
+    @property
+    def column(self):
+        return self & self._column_mask
+
+    def shifted(self, lines):
+        """ Returns these coordinates moved 'lines' lines down. """
+        return int.__new__(Coord, self + (lines << self._column_bits))
+
+    def __getnewargs__(self):
+        return self.line, self.column
 
     def __str__(self):
         if self.line:
@@ -109,6 +596,13 @@ class Coord(object):
             coord_str = ""
         return coord_str
 
+    def __repr__(self):
+        # Node dumps used to hold the formatted string; keep them unchanged.
+        return repr(str(self))
+
+
+# Node classes generated from uc_ast2.cfg by uc_astgen.py: do not edit by hand.
+
 
 class ArrayDecl(Node):
     __slots__ = ('type', 'dim', 'coord')
@@ -131,6 +625,8 @@ class ArrayDecl(Node):
             yield self.dim
 
     attr_names = ()
+    child_slots = ('type', 'dim')
+    list_slots = ()
 
 
 class ArrayRef(Node):
@@ -158,6 +654,8 @@ class ArrayRef(Node):
             yield self.subscript
 
     attr_names = ()
+    child_slots = ('name', 'subscript')
+    list_slots = ()
 
 
 class Assert(Node):
@@ -177,6 +675,8 @@ class Assert(Node):
             yield self.expr
 
     attr_names = ()
+    child_slots = ('expr',)
+    list_slots = ()
 
 
 class Assignment(Node):
@@ -201,6 +701,8 @@ class Assignment(Node):
             yield self.rvalue
 
     attr_names = ('op',)
+    child_slots = ('lvalue', 'rvalue')
+    list_slots = ()
 
 
 class BinaryOp(Node):
@@ -226,7 +728,9 @@ class BinaryOp(Node):
         if self.right is not None:
             yield self.right
 
-    attr_names = ('op', )
+    attr_names = ('op',)
+    child_slots = ('left', 'right')
+    list_slots = ()
 
 
 class Break(Node):
@@ -243,6 +747,8 @@ class Break(Node):
         return
 
     attr_names = ()
+    child_slots = ()
+    list_slots = ()
 
 
 class Cast(Node):
@@ -268,6 +774,8 @@ class Cast(Node):
             yield self.expr
 
     attr_names = ()
+    child_slots = ('to_type', 'expr')
+    list_slots = ()
 
 
 class Compound(Node):
@@ -275,7 +783,7 @@ class Compound(Node):
 
     def __init__(self, block_items, coord=None):
         self.block_items = block_items
-        self.coord = coord.split(":")[0]+":1"
+        self.coord = Coord(coord.line, 1)
 
     def children(self):
         nodelist = []
@@ -288,6 +796,8 @@ class Compound(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('block_items',)
+    list_slots = ('block_items',)
 
 
 class Constant(Node):
@@ -301,13 +811,14 @@ class Constant(Node):
         self.gen_location = None
 
     def children(self):
-        nodelist = []
-        return tuple(nodelist)
+        return ()
 
     def __iter__(self):
         return
 
-    attr_names = ('type', 'value',)
+    attr_names = ('type', 'value')
+    child_slots = ()
+    list_slots = ()
 
 
 class Decl(Node):
@@ -332,6 +843,8 @@ class Decl(Node):
             yield self.init
 
     attr_names = ('name',)
+    child_slots = ('type', 'init')
+    list_slots = ()
 
 
 class DeclList(Node):
@@ -352,10 +865,12 @@ class DeclList(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('decls',)
+    list_slots = ('decls',)
 
 
 class EmptyStatement(Node):
-    __slots__ = ('coord')
+    __slots__ = ('coord',)
 
     def __init__(self, coord=None):
         self.coord = coord
@@ -367,6 +882,8 @@ class EmptyStatement(Node):
         return
 
     attr_names = ()
+    child_slots = ()
+    list_slots = ()
 
 
 class ExprList(Node):
@@ -387,6 +904,8 @@ class ExprList(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('exprs',)
+    list_slots = ('exprs',)
 
 
 class For(Node):
@@ -419,6 +938,8 @@ class For(Node):
             yield self.stmt
 
     attr_names = ()
+    child_slots = ('init', 'cond', 'next', 'stmt')
+    list_slots = ()
 
 
 class FuncCall(Node):
@@ -443,7 +964,9 @@ class FuncCall(Node):
         if self.args is not None:
             yield self.args
 
-    attr_names = ( )
+    attr_names = ()
+    child_slots = ('name', 'args')
+    list_slots = ()
 
 
 class FuncDecl(Node):
@@ -467,7 +990,9 @@ class FuncDecl(Node):
         if self.type is not None:
             yield self.type
 
-    attr_names = ( )
+    attr_names = ()
+    child_slots = ('args', 'type')
+    list_slots = ()
 
 
 class FuncDef(Node):
@@ -502,6 +1027,8 @@ class FuncDef(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('spec', 'decl', 'body', 'param_decls')
+    list_slots = ('param_decls',)
 
 
 class GlobalDecl(Node):
@@ -523,29 +1050,31 @@ class GlobalDecl(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('decls',)
+    list_slots = ('decls',)
 
 
 class ID(Node):
     __slots__ = ('name', 'coord', 'type', 'bind', 'scope', 'gen_location', 'kind')
-    # __slots__ = ('name', 'coord')
 
-    def __init__(self, name,  coord=None):
+    def __init__(self, name, coord=None):
         self.name = name
         self.coord = coord
         self.type = None
         self.bind = None
         self.scope = None
-        self.kind = None
         self.gen_location = None
+        self.kind = None
 
     def children(self):
-        nodelist = []
-        return tuple(nodelist)
+        return ()
 
     def __iter__(self):
         return
 
     attr_names = ('name',)
+    child_slots = ()
+    list_slots = ()
 
 
 class If(Node):
@@ -573,6 +1102,8 @@ class If(Node):
             yield self.iffalse
 
     attr_names = ()
+    child_slots = ('cond', 'iftrue', 'iffalse')
+    list_slots = ()
 
 
 class InitList(Node):
@@ -595,6 +1126,8 @@ class InitList(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('exprs',)
+    list_slots = ('exprs',)
 
 
 class ParamList(Node):
@@ -615,6 +1148,8 @@ class ParamList(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('params',)
+    list_slots = ('params',)
 
 
 class Print(Node):
@@ -635,16 +1170,19 @@ class Print(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('expr',)
+    list_slots = ('expr',)
 
 
 class Program(Node):
-    __slots__ = ('gdecls', 'symtab', 'coord','text')
+    __slots__ = ('gdecls', 'symtab', 'coord', 'text', 'node_index')
 
     def __init__(self, gdecls, symtab=None, coord=None, text=None):
         self.gdecls = gdecls
         self.symtab = None
         self.coord = coord
         self.text = None
+        self.node_index = None
 
     def children(self):
         nodelist = []
@@ -657,6 +1195,8 @@ class Program(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('gdecls',)
+    list_slots = ('gdecls',)
 
 
 class PtrDecl(Node):
@@ -676,6 +1216,8 @@ class PtrDecl(Node):
             yield self.type
 
     attr_names = ()
+    child_slots = ('type',)
+    list_slots = ()
 
 
 class Read(Node):
@@ -696,6 +1238,8 @@ class Read(Node):
             yield child
 
     attr_names = ()
+    child_slots = ('names',)
+    list_slots = ('names',)
 
 
 class Return(Node):
@@ -715,6 +1259,8 @@ class Return(Node):
             yield self.expr
 
     attr_names = ()
+    child_slots = ('expr',)
+    list_slots = ()
 
 
 class Type(Node):
@@ -725,13 +1271,14 @@ class Type(Node):
         self.coord = coord
 
     def children(self):
-        nodelist = []
-        return tuple(nodelist)
+        return ()
 
     def __iter__(self):
         return
 
-    attr_names = ('names', )
+    attr_names = ('names',)
+    child_slots = ()
+    list_slots = ()
 
 
 class VarDecl(Node):
@@ -753,6 +1300,8 @@ class VarDecl(Node):
             yield self.type
 
     attr_names = ()
+    child_slots = ('type',)
+    list_slots = ()
 
 
 class UnaryOp(Node):
@@ -774,7 +1323,9 @@ class UnaryOp(Node):
         if self.expr is not None:
             yield self.expr
 
-    attr_names = ('op', )
+    attr_names = ('op',)
+    child_slots = ('expr',)
+    list_slots = ()
 
 
 class While(Node):
@@ -799,3 +1350,182 @@ class While(Node):
             yield self.stmt
 
     attr_names = ()
+    child_slots = ('cond', 'stmt')
+    list_slots = ()
+
+
+# End of generated node classes.
+
+
+class PackedAST(object):
+    """ A read-only AST packed into parallel arrays, one entry per node in
+        preorder (so the root is node 0):
+            - kinds: the class of the node, as an index in node_classes
+            - coords: the packed Coord of the node (0 for none)
+            - values: index in 'constants' of the tuple of the node's other
+              attributes (op, names, constant value...), None for nodes and
+              for lists of nodes the positions of their None items
+            - child_start: the children of node i are the node indices in
+              children[child_start[i]:child_start[i + 1]], and child_slots
+              holds the attribute each of them came from, as an index in
+              slot_names
+        Equal attribute tuples are stored once. Nodes held by attributes that
+        are not children (the ID name of a Decl) are packed as children too,
+        under the attribute name prefixed with '.'. Walk the tree with
+        view(), whose NodeViews look like the original nodes to a NodeVisitor
+        and to show(). Pack trees as parse() returns them: semantic analysis
+        links nodes into cycles.
+    """
+    node_classes = ()
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.coords = array('Q')
+        self.values = array('I')
+        self.child_start = array('I')
+        self.children = array('I')
+        self.child_slots = array('B')
+        self.constants = []
+        self.slot_names = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @classmethod
+    def pack(cls, root):
+        """ Packs the tree under the Node root. """
+        tree = cls()
+        kinds, coords, values = tree.kinds, tree.coords, tree.values
+        kind_of = {name: kind for kind, name in enumerate(cls.node_classes)}
+        constant_of = {}
+        slot_of = {}
+        child_lists = []
+        stack = [(root, -1, 0)]
+        while stack:
+            node, parent, slot = stack.pop()
+            index = len(child_lists)
+            child_lists.append([])
+            if parent >= 0:
+                child_lists[parent].append((slot, index))
+            kind = kind_of[node.__class__.__name__]
+            kinds.append(kind)
+            coords.append(node.coord or 0)
+
+            children = []
+            for name in node.child_slots:
+                child = getattr(node, name)
+                if child is None:
+                    continue
+                if name in node.list_slots:
+                    children.extend((name, item) for item in child if item is not None)
+                else:
+                    children.append((name, child))
+            named = set(name for name, _ in children)
+            value = []
+            for name in _view_classes[kind].value_slots:
+                v = getattr(node, name, None)
+                if isinstance(v, Node):
+                    if name not in named:
+                        children.append(('.' + name, v))
+                    v = None
+                elif name in node.list_slots:
+                    v = None if v is None else tuple(i for i, item in enumerate(v) if item is None)
+                elif name in named:
+                    v = None
+                value.append(v)
+            key = tuple(tuple(v) if isinstance(v, list) else v for v in value)
+            if key not in constant_of:
+                constant_of[key] = len(tree.constants)
+                tree.constants.append(tuple(value))
+            values.append(constant_of[key])
+
+            for name, child in reversed(children):
+                if name not in slot_of:
+                    slot_of[name] = len(tree.slot_names)
+                    tree.slot_names.append(name)
+                stack.append((child, index, slot_of[name]))
+
+        start = 0
+        for child_list in child_lists:
+            tree.child_start.append(start)
+            start += len(child_list)
+            for slot, index in child_list:
+                tree.child_slots.append(slot)
+                tree.children.append(index)
+        tree.child_start.append(start)
+        return tree
+
+    def view(self, index=0):
+        """ Returns the NodeView of node 'index', the root by default. """
+        return _view_classes[self.kinds[index]](self, index)
+
+
+class NodeView(object):
+    """ A node of a PackedAST, seen as the Node it was packed from: it has
+        the same class name, attributes, children(), iteration, repr and
+        show(), all read from the arrays on access. Nothing can be assigned.
+    """
+    __slots__ = ('tree', 'index')
+
+    node_slots = ()
+    value_slots = ()
+    child_slots = ()
+    list_slots = ()
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    @property
+    def coord(self):
+        coord = self.tree.coords[self.index]
+        return int.__new__(Coord, coord) if coord else None
+
+    def _slots(self):
+        tree = self.tree
+        first, last = tree.child_start[self.index], tree.child_start[self.index + 1]
+        return zip(tree.child_slots[first:last], tree.children[first:last])
+
+    def _get(self, name):
+        tree = self.tree
+        value = tree.constants[tree.values[self.index]][self.value_slots.index(name)]
+        if name in self.list_slots:
+            if value is None:
+                return None
+        elif value is not None:
+            return list(value) if isinstance(value, list) else value
+        found = [tree.view(child) for slot, child in self._slots() if tree.slot_names[slot] in (name, '.' + name)]
+        if name in self.list_slots:
+            for i in value:
+                found.insert(i, None)
+            return found
+        return found[0] if found else None
+
+    def __repr__(self):
+        return _node_repr(self, self.node_slots[:-1])
+
+    show = Node.show
+
+
+def _view_class(cls):
+    """ Returns the NodeView class standing for the Node class cls. """
+    slots = cls.__slots__
+    value_slots = tuple(name for name in slots if name != 'coord')
+    namespace = {'__slots__': (), '__module__': cls.__module__, 'attr_names': cls.attr_names,
+                 'node_slots': slots, 'value_slots': value_slots,
+                 'child_slots': cls.child_slots, 'list_slots': cls.list_slots,
+                 'children': cls.children, '__iter__': cls.__iter__}
+    for name in value_slots:
+        namespace[name] = property(lambda self, name=name: self._get(name))
+    return type(cls.__name__, (NodeView,), namespace)
+
+
+PackedAST.node_classes = tuple(sorted(name for name, cls in list(globals().items())
+                                      if isinstance(cls, type) and issubclass(cls, Node) and cls is not Node))
+_view_classes = [_view_class(globals()[name]) for name in PackedAST.node_classes]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# ============================================================
+# uc_astgen -- generates the AST node classes of uc_ast2.py
+#
+# The classes are described in uc_ast2.cfg and written into
+# uc_ast2.py, between the BEGIN and END marker lines, by:
+#
+#       python3 uc_astgen.py
+#
+# With --check nothing is written and the exit status tells
+# whether uc_ast2.py is up to date with the spec.
+# ============================================================
+
+import os
+import re
+import sys
+import argparse
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+BEGIN = "# Node classes generated from uc_ast2.cfg by uc_astgen.py: do not edit by hand.\n"
+END = "# End of generated node classes.\n"
+
+_entry = re.compile(r'^\s*(\w+)\s*:\s*\[(.*?)\]\s*(?:\[(.*)\])?\s*([\w\s]*)$')
+
+# Options of an entry, after its slots.
+_options = ('enumerate', 'skip_none')
+
+
+class NodeCfg(object):
+    """ One node class of the spec: its name, its slots in order, the
+        order of its children and its options.
+    """
+
+    def __init__(self, name, fields, order=None, options=()):
+        self.name = name
+        self.slots = []
+        self.args = []
+        self.kwargs = []
+        self.ignored = []
+        self.inits = []
+        self.attr = []
+        self.children = []
+        self.lists = []
+        for option in options:
+            if option not in _options:
+                raise SyntaxError("unknown option %r of %s" % (option, name))
+        self.enumerate = 'enumerate' in options
+        self.skip_none = 'skip_none' in options
+        after_coord = False
+        for field in fields:
+            if '=' in field:
+                slot, source = field.split('=', 1)
+                self.inits.append((slot, source or 'None'))
+                self.slots.append(slot)
+                if slot == 'coord':
+                    after_coord = True
+                continue
+            slot = field.rstrip('*-~')
+            self.slots.append(slot)
+            if slot == 'coord':
+                after_coord = True
+            elif after_coord:
+                self.kwargs.append(slot)
+            else:
+                if self.ignored and not field.endswith('~'):
+                    raise SyntaxError("%s: argument %s follows an ignored one" % (name, slot))
+                self.args.append(slot)
+            if field.endswith('~'):
+                self.ignored.append(slot)
+                self.inits.append((slot, 'None'))
+                continue
+            self.inits.append((slot, slot))
+            if field.endswith('**'):
+                self.children.append(slot)
+                self.lists.append(slot)
+            elif field.endswith('*'):
+                self.children.append(slot)
+            elif not field.endswith('-') and slot != 'coord':
+                self.attr.append(slot)
+        if order is not None:
+            if sorted(order) != sorted(self.children):
+                raise SyntaxError("%s: the children order must list every child" % name)
+            self.children = order
+
+    def generate(self):
+        src = "class %s(Node):\n" % self.name
+        src += "    __slots__ = %s\n\n" % _tuple(self.slots)
+        src += self._gen_init() + "\n"
+        src += self._gen_children() + "\n"
+        src += self._gen_iter() + "\n"
+        src += "    attr_names = %s\n" % _tuple(self.attr)
+        src += "    child_slots = %s\n" % _tuple(self.children)
+        src += "    list_slots = %s\n" % _tuple(self.lists)
+        return src
+
+    def _gen_init(self):
+        args = ['self'] + ['%s=None' % name if name in self.ignored else name for name in self.args]
+        args += ['coord=None'] + ['%s=None' % name for name in self.kwargs]
+        src = "    def __init__(%s):\n" % ', '.join(args)
+        for slot, source in self.inits:
+            src += "        self.%s = %s\n" % (slot, source)
+        return src
+
+    def _gen_children(self):
+        src = "    def children(self):\n"
+        if not self.children:
+            return src + "        return ()\n"
+        src += "        nodelist = []\n"
+        for name in self.children:
+            if name in self.lists:
+                src += ("        for i, child in enumerate(self.%s or []):\n"
+                        "            %snodelist.append((\"%s[%%d]\" %% i, child))\n") % (
+                    name, 'if child is not None: ' if self.skip_none else '', name)
+            else:
+                src += "        if self.%s is not None: nodelist.append((\"%s\", self.%s))\n" % (name, name, name)
+        return src + "        return tuple(nodelist)\n"
+
+    def _gen_iter(self):
+        src = "    def __iter__(self):\n"
+        if not self.children:
+            return src + "        return\n"
+        for name in self.children:
+            if name in self.lists:
+                src += ("        for child in %s(self.%s or []):\n"
+                        "            yield child\n") % ('enumerate' if self.enumerate else '', name)
+            else:
+                src += ("        if self.%s is not None:\n"
+                        "            yield self.%s\n") % (name, name)
+        return src
+
+
+def _tuple(names):
+    if len(names) == 1:
+        return "('%s',)" % names[0]
+    return '(' + ', '.join("'%s'" % name for name in names) + ')'
+
+
+def _fields(text):
+    """ Splits text at the commas that are not inside parentheses. """
+    fields = []
+    depth = 0
+    field = ''
+    for c in text:
+        if c == ',' and depth == 0:
+            fields.append(field)
+            field = ''
+            continue
+        depth += (c == '(') - (c == ')')
+        field += c
+    fields.append(field)
+    return [field.strip() for field in fields if field.strip()]
+
+
+def parse_cfg(filename):
+    """ Returns the NodeCfg of each entry of the spec, in order. """
+    entries = []
+    with open(filename) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            match = _entry.match(line)
+            if match is None:
+                raise SyntaxError("invalid entry in %s: %r" % (filename, line))
+            name, fields, order, options = match.groups()
+            if order is not None:
+                order = _fields(order)
+            entries.append(NodeCfg(name, _fields(fields), order, options.split()))
+    return entries
+
+
+def generate(cfg_filename, ast_filename):
+    """ Returns the text of ast_filename with its generated section
+        rebuilt from cfg_filename.
+    """
+    with open(ast_filename) as f:
+        text = f.read()
+    start = text.index(BEGIN) + len(BEGIN)
+    end = text.index(END)
+    classes = '\n\n'.join(entry.generate() for entry in parse_cfg(cfg_filename))
+    return text[:start] + '\n\n' + classes + '\n\n' + text[end:]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action='store_true', help="only check that uc_ast2.py is up to date")
+    args = parser.parse_args()
+    cfg_filename = os.path.join(_here, 'uc_ast2.cfg')
+    ast_filename = os.path.join(_here, 'uc_ast2.py')
+    text = generate(cfg_filename, ast_filename)
+    with open(ast_filename) as f:
+        current = f.read()
+    if args.check:
+        if text != current:
+            print("uc_ast2.py is out of date, run uc_astgen.py")
+            sys.exit(1)
+        sys.exit(0)
+    if text != current:
+        with open(ast_filename, 'w') as f:
+            f.write(text)
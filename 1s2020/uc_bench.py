@@ -0,0 +1,1038 @@
+#!/usr/bin/env python3
+# ============================================================
+# uc_bench -- micro benchmarks for the uc compiler
+#
+# Each benchmark is a function registered in BENCHMARKS and is
+# run by name from the command line, e.g.:
+#
+#       python3 uc_bench.py startup
+#
+# Sources come from Files/*.uc unless a filename is given.
+# ============================================================
+
+import gc
+import io
+import os
+import copy
+import mmap
+import sys
+import glob
+import time
+import random
+import argparse
+import contextlib
+import tempfile
+import tracemalloc
+import subprocess
+from statistics import median
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def _sources(args):
+    if args.filename:
+        return [args.filename]
+    return sorted(glob.glob(os.path.join(_here, 'Files', '*.uc')))
+
+
+def _report(name, values, unit):
+    print("%-28s %12.3f %s" % (name, values, unit))
+
+
+def _timeit(func, repeat):
+    """ Returns the median wall time of 'repeat' calls to func. """
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    return median(times)
+
+
+def _synthetic(n):
+    """ Returns a valid uC program with n global variables and n small functions. """
+    parts = []
+    for i in range(n):
+        parts.append("int g%d = %d;\n" % (i, i))
+        parts.append(
+            "int f%d(int a, int b) {\n"
+            "    int x = a + b * 2;\n"
+            "    int v[3] = {1, 2, 3};\n"
+            "    if (x > 10) {\n"
+            "        x = x - g%d;\n"
+            "    } else {\n"
+            "        x = x + v[1];\n"
+            "    }\n"
+            "    while (x < 100) x = x * 2;\n"
+            "    for (int i = 0; i < 3; i++) x += i;\n"
+            "    print(x);\n"
+            "    return x;\n"
+            "}\n" % (i, i))
+    parts.append("int main() {\n    int r = f0(1, 2);\n    assert r > 0;\n    return 0;\n}\n")
+    return ''.join(parts)
+
+
+def _count_reductions(parser, code):
+    """ Parses code once with counting copies of the grammar actions. """
+    count = 0
+
+    def counted(action):
+        def counted_action(p):
+            nonlocal count
+            count += 1
+            action(p)
+        return counted_action
+
+    plain = parser.parser.productions
+    parser.parser.productions = []
+    for prod in plain:
+        prod = copy.copy(prod)
+        if prod.callable:
+            prod.callable = counted(prod.callable)
+        parser.parser.productions.append(prod)
+    try:
+        parser.parser.parse(code, lexer=parser.lexer.lexer, tracking=False)
+    finally:
+        parser.parser.productions = plain
+    return count
+
+
+def _lex(engine, code):
+    """ Returns the tokens of code as (type, value, lineno, lexpos), the
+        printed errors and the final line number.
+    """
+    from uc_lexer import UCLexer
+    lexer = UCLexer(None)
+    lexer.build(engine=engine)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        lexer.reset(code)
+        tokens = [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lexer.token, None)]
+    return tokens, out.getvalue(), lexer.lexer.lineno
+
+
+def _lex_columns(code, encode):
+    """ Returns the tokens that the scanner lexes from code, or from its
+        UTF-8 bytes if encode, as (type, value, lineno, column), and the
+        printed errors.
+    """
+    from uc_lexer import UCLexer
+    lexer = UCLexer(None)
+    lexer.build(engine='scanner')
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        lexer.reset(code.encode('utf-8') if encode else code)
+        tokens = [(t.type, t.value, t.lineno, lexer.find_column(t.lexpos)) for t in iter(lexer.token, None)]
+    return tokens, out.getvalue()
+
+
+_fuzz_alphabet = 'intfloatcharifelsewhile_xyz0123456789.+-*/%=<>!&|(){}[];,\'"\n \t#$@/*'
+_fuzz_utf8 = 'éçã€😀'
+
+
+_hashes_script = """
+import sys
+from uc_parser import UCParser
+from uc_ast2 import summarize
+ast = UCParser().parse(open(sys.argv[1]).read(), '', False)
+print(' '.join(summary.hash for summary in summarize(ast)))
+"""
+
+
+def bench_hashes(args):
+    """ Time to hash a synthetic source and summarize its declarations.
+        Then edits one function and moves every line down: only the hash
+        of that function may change, and not its signature. The hashes
+        must also be the same in another process.
+    """
+    from uc_parser import UCParser
+    from uc_ast2 import summarize
+    parser = UCParser()
+    code = _synthetic(args.size)
+    ast = parser.parse(code, '', False)
+    t_hash = _timeit(lambda: summarize(ast), args.repeat)
+    summaries = summarize(ast)
+    _report("declarations", len(summaries), "")
+    _report("hash and summarize", t_hash * 1000, "ms")
+
+    edited = '\n\n' + code.replace('x = x * 2', 'x = x * 3', 1).replace('    ', '\t')
+    changed = [(old, new) for old, new in zip(summaries, summarize(parser.parse(edited, '', False)))
+               if old.hash != new.hash]
+    ok = len(changed) == 1 and changed[0][0].names == ('f0',) and changed[0][0].signature == changed[0][1].signature
+    print("one function changed" if ok else "%d declarations changed" % len(changed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'big.uc')
+        with open(filename, 'w') as f:
+            f.write(code)
+        env = dict(os.environ, PYTHONHASHSEED='12345')
+        out = subprocess.run([sys.executable, '-c', _hashes_script, filename], cwd=_here, env=env,
+                             stdout=subprocess.PIPE, check=True)
+    stable = out.stdout.decode().split() == [summary.hash for summary in summaries]
+    print("hashes stable" if stable else "hashes differ between processes")
+    return 0 if ok and stable else 1
+
+
+def _nested_loops(n):
+    """ Returns a uC program with n nested for loops, each declaring its
+        own index and testing it against a global.
+    """
+    loops = ''.join('for (int i%d = 0; i%d < g; i%d++) ' % (i, i, i) for i in range(n))
+    return ('int g = 1;\nint main() {\n    int a = 0;\n    ' + loops +
+            'a = a + g + i0 + i%d;\n    return a;\n}\n' % (n - 1))
+
+
+def _scan_lookup(self, obj):
+    """ Environment.lookup() as a scan of the scopes, innermost first. """
+    for scope in reversed(self.stack):
+        this = scope.lookup(obj)
+        if this is not None:
+            return this
+    return None
+
+
+def _bindings(ast):
+    """ Returns what semantic analysis found for each ID of ast. """
+    from uc_ast2 import walk
+    found = []
+
+    def pre(node, name, depth):
+        if node.__class__.__name__ == 'ID':
+            found.append((node.name, node.kind, node.scope, node.bind.__class__.__name__,
+                          node.bind is not None and node.bind.coord, node.type and tuple(node.type.names)))
+
+    walk(ast, pre)
+    return found
+
+
+def bench_scopes(args):
+    """ Semantic analysis of 1,000 nested scopes (for loops declaring their
+        index) with Environment.lookup() probing one dict, versus scanning
+        the stack of scopes. Both must bind every ID alike.
+    """
+    import uc_sema
+    from uc_parser import UCParser
+    from uc_sema import Visitor, Environment
+    parser = UCParser()
+    code = _nested_loops(1000)
+    lookup = Environment.lookup
+    results = {}
+    for mode in ('scan', 'dict'):
+        Environment.lookup = _scan_lookup if mode == 'scan' else lookup
+        try:
+            asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+            t = median(_timeit(lambda: Visitor(False).visit(ast), 1) for ast in asts)
+        finally:
+            Environment.lookup = lookup
+        results[mode] = [_bindings(ast) for ast in asts[:1]]
+        _report("%s lookup sema" % mode, t * 1000, "ms")
+    same = results['scan'] == results['dict']
+    print("same bindings" if same else "different bindings")
+    return 0 if same else 1
+
+
+_optimized_script = """
+from uc_parser import UCParser
+from uc_sema import Visitor, SemanticError
+ast = UCParser().parse('int main() { int a; float f; a = a + f; return 0; }', '', False)
+try:
+    Visitor(False).visit(ast)
+except SemanticError as e:
+    print(e)
+"""
+
+
+def bench_sema(args):
+    """ Semantic analysis throughput, in nodes per second, on large
+        synthetic and expression-heavy sources. Then checks that semantic
+        errors are still reported under 'python -O'.
+    """
+    from uc_parser import UCParser
+    from uc_sema import Visitor
+    parser = UCParser()
+    for name, code in (('synthetic', _synthetic(args.size)), ('expressions', _expressions(args.size))):
+        asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+        nodes = _count_slots(asts[0])
+        t = min(_timeit(lambda: Visitor(False).visit(ast), 1) for ast in asts)
+        _report("%s sema" % name, t * 1000, "ms")
+        _report("%s throughput" % name, nodes / t / 1e6, "M nodes/s")
+    out = subprocess.run([sys.executable, '-O', '-c', _optimized_script], cwd=_here,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    reported = 'Cannot assign' in out.stdout.decode()
+    print("errors reported under -O" if reported else "errors lost under -O")
+    return 0 if reported else 1
+
+
+def _faulty(n):
+    """ Returns the _synthetic(n) program with an independent semantic error
+        in every tenth function, and the number of errors.
+    """
+    faults = (("x = x - g{};", "x = x - h{};"), ("x = x - g{};", "x = 1.5;"),
+              ("x = x - g{};", "if (x) x = 0;"), ("int v[3]", "int x[2]; int v[3]"),
+              ("int v[3]", "int *x; int v[3]"))
+    parts = _synthetic(n).split("int f")
+    count = 0
+    for i in range(0, n, 10):
+        old, new = faults[count % len(faults)]
+        parts[i + 1] = parts[i + 1].replace(old.format(i), new.format(i))
+        count += 1
+    return "int f".join(parts), count
+
+
+def bench_errors(args):
+    """ Semantic analysis of a source with many independent errors, stopping
+        at the first one versus collecting all of them in one pass, which
+        must find them again on a second pass, and the cost of collecting on
+        a valid source, whose checked AST must be the same either way.
+    """
+    from uc_parser import UCParser
+    from uc_sema import Visitor, SemanticError, ErrorResult, ErrorType
+    from uc_ast2 import dump
+    parser = UCParser()
+    code, expected = _faulty(args.size)
+
+    def first(ast):
+        try:
+            Visitor(False).visit(ast)
+        except SemanticError:
+            pass
+
+    errors = []
+
+    def collect(ast):
+        del errors[:]
+        Visitor(False, errors.append).visit(ast)
+
+    asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+    t_first = min(_timeit(lambda: first(ast), 1) for ast in asts)
+    asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+    t_all = min(_timeit(lambda: collect(ast), 1) for ast in asts)
+    _report("first error", t_first * 1000, "ms")
+    found = len(errors)
+    _report("all %d errors" % found, t_all * 1000, "ms")
+    # A second pass in the same process must find the same errors: the
+    # shared types, such as the error type, must come out of the first unchanged.
+    messages = [str(e) for e in errors]
+    collect(parser.parse(code, '', False))
+    repeated = messages == [str(e) for e in errors] and list(ErrorResult.names) == [ErrorType]
+
+    code = _synthetic(args.size)
+    asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+    t_stop = min(_timeit(lambda: Visitor(False).visit(ast), 1) for ast in asts)
+    asts = [parser.parse(code, '', False) for _ in range(args.repeat)]
+    t_collect = min(_timeit(lambda: collect(ast), 1) for ast in asts)
+    _report("valid source, stopping", t_stop * 1000, "ms")
+    _report("valid source, collecting", t_collect * 1000, "ms")
+    texts = []
+    for errs in (None, []):
+        ast = parser.parse(code, '', False)
+        Visitor(False, errs if errs is None else errs.append).visit(ast)
+        buf = io.StringIO()
+        dump(ast, buf, showcoord=True)
+        texts.append(buf.getvalue())
+    failed = found != expected or not repeated or errs or texts[0] != texts[1]
+    print("%d of %d errors found%s, %s checked AST" % (found, expected, "" if repeated else " (not again)",
+                                                        "same" if texts[0] == texts[1] else "different"))
+    return 1 if failed else 0
+
+
+def _index_state(index):
+    return {kind: sorted(map(id, index.nodes(kind))) for kind in index.kinds()}
+
+
+def bench_index(args):
+    """ Finding every FuncCall and every use of a global of a checked
+        synthetic source by walking the tree versus through its NodeIndex,
+        and the time to build the index (once, on first use). Then rewrites the tree through the
+        index and checks that it matches an index built from scratch, also
+        after a pickle round trip, and so does an index built between parse
+        and semantic analysis, which fills in array sizes.
+    """
+    import pickle
+    from uc_parser import UCParser
+    from uc_sema import Visitor
+    from uc_ast2 import NodeIndex, Constant, GlobalDecl, walk, index_of
+    ast = UCParser().parse(_synthetic(args.size), '', False)
+    Visitor(False).visit(ast)
+    index = index_of(ast)
+
+    def by_walk():
+        calls, uses = [], []
+
+        def pre(node, name, depth):
+            kind = node.__class__.__name__
+            if kind == 'FuncCall':
+                calls.append(node)
+            elif kind == 'ID' and node.name == 'g1':
+                uses.append(node)
+
+        walk(ast, pre)
+        return calls, uses
+
+    def by_index():
+        return index.nodes('FuncCall'), index.uses('g1')
+
+    assert [list(map(id, found)) for found in by_walk()] == [list(map(id, found)) for found in by_index()]
+    t_build = _timeit(lambda: NodeIndex(ast), args.repeat)
+    t_walk = _timeit(by_walk, args.repeat)
+    t_index = _timeit(by_index, args.repeat)
+    _report("indexed nodes", len(index), "")
+    _report("build index", t_build * 1000, "ms")
+    _report("query by walk", t_walk * 1000, "ms")
+    _report("query by index", t_index * 1000, "ms")
+    _report("speedup", t_walk / t_index, "x")
+
+    for ret in index.nodes('Return'):
+        index.replace(ret, 'expr', Constant('int', 0))
+    for i in range(len(ast.gdecls) - 1, 0, -4):
+        index.remove(ast, 'gdecls', i)
+    index.insert(ast, 'gdecls', GlobalDecl([]), 0)
+    index.add(ast.gdecls[1])
+    index.discard(ast.gdecls[1])
+    consistent = _index_state(index) == _index_state(NodeIndex(ast))
+    copy = pickle.loads(pickle.dumps(ast, pickle.HIGHEST_PROTOCOL))
+    consistent = consistent and _index_state(copy.node_index) == _index_state(NodeIndex(copy))
+
+    code = 'char s[] = "uc";\n' + _synthetic(args.size).replace('int v[3]', 'int v[]')
+    ast = UCParser().parse(code, '', False)
+    index = index_of(ast)
+    Visitor(False).visit(ast)
+    consistent = consistent and _index_state(index) == _index_state(NodeIndex(ast))
+    print("index consistent" if consistent else "index inconsistent")
+    return 0 if consistent else 1
+
+
+def bench_lexers(args):
+    """ Checks that PLY's lexer and the precompiled scanner produce the same
+        tokens, errors and line numbers on every source, on a synthetic
+        source and on random strings, and that the scanner lexes the same
+        tokens and columns from their UTF-8 bytes, then compares their
+        tokens per second.
+    """
+    from uc_lexer import UCLexer
+    sources = [open(f).read() for f in _sources(args)] + [_synthetic(20)]
+    rng = random.Random(args.size)
+    fuzz = [''.join(rng.choice(_fuzz_alphabet) for _ in range(rng.randint(0, 80))) for _ in range(2000)]
+    fuzz_utf8 = [''.join(rng.choice(_fuzz_alphabet + _fuzz_utf8 * 4) for _ in range(rng.randint(0, 80)))
+                 for _ in range(1000)]
+    mismatches = 0
+    for code in sources + fuzz:
+        if _lex('ply', code) != _lex('scanner', code):
+            mismatches += 1
+            print("mismatch on %r" % code[:60])
+    for code in sources + fuzz + fuzz_utf8:
+        if _lex_columns(code, False) != _lex_columns(code, True):
+            mismatches += 1
+            print("bytes mismatch on %r" % code[:60])
+    _report("inputs compared", len(sources) + len(fuzz) + len(fuzz_utf8), "")
+    _report("mismatches", mismatches, "")
+
+    inputs = [('files', ''.join(sources)), ('synthetic', _synthetic(args.size))]
+    for name, code in inputs:
+        for engine in ('ply', 'scanner'):
+            lexer = UCLexer(None)
+            lexer.build(engine=engine)
+            count = len(_lex(engine, code)[0])
+
+            def run():
+                lexer.reset(code)
+                token = lexer.lexer.token
+                while token():
+                    pass
+            _report("%s %s" % (name, engine), count / _timeit(run, args.repeat) / 1e6, "M tokens/s")
+    return 1 if mismatches else 0
+
+
+def _lex_file(filename, use_mmap):
+    """ Lexes a file with the scanner, read into a string or memory mapped.
+        Returns the seconds to the first token, the total seconds and the
+        number of tokens.
+    """
+    from uc_lexer import UCLexer
+    lexer = UCLexer(None)
+    lexer.build(engine='scanner')
+    t = time.perf_counter()
+    with open(filename, 'rb' if use_mmap else 'r') as source:
+        data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else source.read()
+        lexer.reset(data)
+        count = 1 if lexer.token() else 0
+        first = time.perf_counter() - t
+        while lexer.token():
+            count += 1
+        total = time.perf_counter() - t
+        lexer.reset('')
+        if use_mmap:
+            data.close()
+    return first, total, count
+
+
+def bench_stream(args):
+    """ Time to the first token, total lexing time and peak Python heap
+        when a large generated file is read into a string or lexed from a
+        memory map of its bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'big.uc')
+        with open(filename, 'w') as f:
+            f.write(_synthetic(args.size))
+        _report("source size", os.path.getsize(filename) / 2 ** 20, "MB")
+        for mode, use_mmap in (('text', False), ('mmap', True)):
+            tracemalloc.start()
+            first, total, count = _lex_file(filename, use_mmap)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _report("%s first token" % mode, first * 1000, "ms")
+            _report("%s tokens per second" % mode, count / _lex_file(filename, use_mmap)[1] / 1e6, "M/s")
+            _report("%s peak heap" % mode, peak / 2 ** 20, "MB")
+
+
+def bench_pipeline(args):
+    """ Peak Python heap and wall time of compiling a large synthetic
+        source to uCIR as a whole or with --stream, which releases each
+        function once it is emitted. Both must write the same uCIR.
+    """
+    from uc import Compiler, errors_reported
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'big.uc')
+        with open(filename, 'w') as f:
+            f.write(_synthetic(args.size))
+        ir = {}
+        for mode, stream in (('batch', False), ('stream', True)):
+            cl_args = argparse.Namespace(filename=filename, susy=False, ast=False, ast_format='text', ir=True,
+                                         no_run=True, cfg=False, opt=False, scanner=False, mmap=False, jobs=1,
+                                         cache=False, debug=False, llvm=False, llvm_opt=None, stream=stream,
+                                         all_errors=False)
+
+            def compile():
+                with contextlib.redirect_stderr(io.StringIO()):
+                    Compiler(cl_args).compile()
+
+            tracemalloc.start()
+            compile()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(filename[:-3] + '.ir') as f:
+                ir[mode] = f.read()
+            _report("%s compile" % mode, _timeit(compile, args.repeat) * 1000, "ms")
+            _report("%s peak heap" % mode, peak / 2 ** 20, "MB")
+    if errors_reported():
+        print("errors reported")
+        return 1
+    same = ir['batch'] == ir['stream']
+    print("same uCIR" if same else "different uCIR")
+    return 0 if same else 1
+
+
+def bench_tokens(args):
+    """ Memory of the tokens of a large synthetic source kept as a list of
+        PLY tokens or as a TokenBuffer, and parse time from the text versus
+        replaying the buffer. Both parses must give the same AST.
+    """
+    from uc_parser import UCParser
+    parser = UCParser()
+    code = _synthetic(args.size)
+
+    tracemalloc.start()
+    parser.lexer.reset(code)
+    tokens = list(iter(parser.lexer.lexer.token, None))
+    list_size = tracemalloc.get_traced_memory()[0]
+    del tokens
+    tracemalloc.stop()
+    tracemalloc.start()
+    buffer = parser.lexer.tokenize(code)
+    buffer_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    _report("tokens", len(buffer), "")
+    _report("token list", list_size / 2 ** 20, "MB")
+    _report("token buffer", buffer_size / 2 ** 20, "MB")
+    _report("memory ratio", list_size / buffer_size, "x")
+
+    t_text = _timeit(lambda: parser.parse(code, '', False), args.repeat)
+    t_buffer = _timeit(lambda: parser.parse_tokens(buffer), args.repeat)
+    _report("parse from text", t_text * 1000, "ms")
+    _report("parse from buffer", t_buffer * 1000, "ms")
+
+    expected, replayed = io.StringIO(), io.StringIO()
+    parser.parse(code, '', False).show(buf=expected, showcoord=True)
+    parser.parse_tokens(buffer).show(buf=replayed, showcoord=True)
+    same = expected.getvalue() == replayed.getvalue()
+    print("same AST" if same else "different AST")
+    return 0 if same else 1
+
+
+def bench_parallel(args):
+    """ Serial parse versus parse_parallel() of a large synthetic source
+        with os.cpu_count() processes. Both must give the same AST.
+    """
+    from uc_parser import UCParser
+    parser = UCParser()
+    code = _synthetic(args.size)
+    workers = os.cpu_count() or 1
+    t_serial = _timeit(lambda: parser.parse(code, '', False), args.repeat)
+    t_parallel = _timeit(lambda: parser.parse_parallel(code, '', False, max(workers, 2)), args.repeat)
+    _report("workers", workers, "")
+    _report("serial parse", t_serial * 1000, "ms")
+    _report("parallel parse", t_parallel * 1000, "ms")
+    _report("speedup", t_serial / t_parallel, "x")
+
+    serial, parallel = io.StringIO(), io.StringIO()
+    parser.parse(code, '', False).show(buf=serial, showcoord=True)
+    parser.parse_parallel(code, '', False, max(workers, 2)).show(buf=parallel, showcoord=True)
+    same = serial.getvalue() == parallel.getvalue()
+    print("same AST" if same else "different AST")
+    return 0 if same else 1
+
+
+def bench_reparse(args):
+    """ Full parse versus reparse() of a large synthetic source after one
+        line is added to a function in its middle. Both must give the same
+        AST.
+    """
+    from uc_parser import UCParser
+    parser = UCParser()
+    code = _synthetic(args.size)
+    middle = code.index('    print(x);\n', len(code) // 2)
+    edited = code[:middle] + '    x = x + 1;\n' + code[middle:]
+
+    t_full = _timeit(lambda: parser.parse(edited, '', False), args.repeat)
+    times = []
+    for _ in range(args.repeat):
+        program = parser.parse(code, '', False)
+        t = time.perf_counter()
+        parser.reparse(program, code, edited)
+        times.append(time.perf_counter() - t)
+    t_reparse = median(times)
+    _report("full parse", t_full * 1000, "ms")
+    _report("reparse", t_reparse * 1000, "ms")
+    _report("speedup", t_full / t_reparse, "x")
+
+    full, incremental = io.StringIO(), io.StringIO()
+    parser.parse(edited, '', False).show(buf=full, showcoord=True)
+    parser.reparse(parser.parse(code, '', False), code, edited).show(buf=incremental, showcoord=True)
+    same = full.getvalue() == incremental.getvalue()
+    print("same AST" if same else "different AST")
+    return 0 if same else 1
+
+
+def bench_operators(args):
+    """ Every entry of the operator tables of uc_sema must agree with the
+        operator sets of the UCTypes they were built from. Then times one
+        table lookup per binary operator against probing those sets and
+        interning the result type.
+    """
+    from uc_sema import BinaryTable, UnaryTable, AssignTable, binary_operation
+    from uc_sema import intern_type, BoolResult, TypeMismatch, Unsupported
+
+    def _probe_binary(op, ltype, rtype):
+        # The binary operator check of semantic analysis before the tables.
+        if ltype is not rtype:
+            return TypeMismatch, None
+        if op in ltype.binary_ops:
+            return None, intern_type((ltype,))
+        if op in ltype.rel_ops:
+            return None, BoolResult
+        return Unsupported, None
+
+    wrong = 0
+    for (op, ltype, rtype), operation in BinaryTable.items():
+        wrong += _probe_binary(op, ltype, rtype) != (operation.error, operation.type)
+    for (op, uctype), operation in UnaryTable.items():
+        wrong += (op in uctype.unary_ops) != (operation.error is None)
+    for (op, uctype), operation in AssignTable.items():
+        wrong += (op in uctype.assign_ops) != (operation.error is None)
+    _report("table entries", len(BinaryTable) + len(UnaryTable) + len(AssignTable), "")
+
+    keys = [key for key in BinaryTable if key[1] is key[2]] * 100
+    t_probe = _timeit(lambda: [_probe_binary(*key) for key in keys], args.repeat)
+    t_table = _timeit(lambda: [binary_operation(*key) for key in keys], args.repeat)
+    _report("probe sets per operator", t_probe / len(keys) * 1e9, "ns")
+    _report("table lookup per operator", t_table / len(keys) * 1e9, "ns")
+    _report("speedup", t_probe / t_table, "x")
+    print("tables agree" if not wrong else "%d entries disagree" % wrong)
+    return 1 if wrong else 0
+
+
+def bench_packed(args):
+    """ Memory and NodeVisitor traversal time of the object AST versus the
+        PackedAST of a synthetic source (about 80 nodes per function, so
+        -n 12500 gives a 1M-node program).
+    """
+    from uc_parser import UCParser
+    from uc_ast2 import PackedAST
+    from uc_sema import NodeVisitor
+
+    class Counter(NodeVisitor):
+        def __init__(self):
+            self.count = 0
+
+        def generic_visit(self, node):
+            self.count += 1
+            for _, child in node.children():
+                self.visit(child)
+
+    def visit(root):
+        counter = Counter()
+        counter.visit(root)
+        return counter.count
+
+    code = _synthetic(args.size)
+    parser = UCParser()
+    parser.parse('int x;', '', False)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    ast = parser.parse(code, '', False)
+    parser.lexer.reset('')
+    gc.collect()
+    object_size = tracemalloc.get_traced_memory()[0] - base
+    packed = PackedAST.pack(ast)
+    t_object = _timeit(lambda: visit(ast), args.repeat)
+    # The LR parser keeps its last stacks, and so the last tree, alive.
+    del ast
+    parser.parse('int x;', '', False)
+    gc.collect()
+    packed_size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    t_packed = _timeit(lambda: visit(packed.view()), args.repeat)
+    binary_op = PackedAST.node_classes.index('BinaryOp')
+    t_scan = _timeit(lambda: packed.kinds.count(binary_op), args.repeat)
+
+    _report("nodes", len(packed), "")
+    _report("object AST", object_size / 2 ** 20, "MB")
+    _report("packed AST", packed_size / 2 ** 20, "MB")
+    _report("memory ratio", object_size / packed_size, "x")
+    _report("visit object AST", t_object * 1000, "ms")
+    _report("visit packed AST views", t_packed * 1000, "ms")
+    _report("count kind in packed arrays", t_scan * 1000, "ms")
+
+
+def _count_children(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(child for _, child in node.children() if child is not None)
+    return count
+
+
+def _count_slots(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        lists = node.list_slots
+        for name in node.child_slots:
+            child = getattr(node, name)
+            if child is None:
+                continue
+            if lists and name in lists:
+                for item in child:
+                    if item is not None:
+                        stack.append(item)
+            else:
+                stack.append(child)
+    return count
+
+
+def bench_children(args):
+    """ Full traversal of the AST of a synthetic source through children()
+        and through the precomputed child_slots of the generated node classes.
+    """
+    from uc_parser import UCParser
+    ast = UCParser().parse(_synthetic(args.size), '', False)
+    nodes = _count_children(ast)
+    ok = _count_slots(ast) == nodes
+    t_children = _timeit(lambda: _count_children(ast), args.repeat)
+    t_slots = _timeit(lambda: _count_slots(ast), args.repeat)
+    _report("nodes", nodes, "")
+    _report("children()", t_children * 1000, "ms")
+    _report("child_slots", t_slots * 1000, "ms")
+    _report("speedup over children()", t_children / t_slots, "x")
+    print("same nodes" if ok else "different nodes")
+    return 0 if ok else 1
+
+
+def _expressions(n):
+    """ A source with n functions of arithmetic and comparisons. """
+    body = ("    int x = a * 3 + b - 1;\n"
+            "    float y = 2.5 * 4.0 - 1.0;\n"
+            "    x = (x + 1) * (b - 2) / (a + 7) % 5;\n"
+            "    if (x * 2 > a + b && b != 0) x = x - a * b;\n"
+            "    return x + a * 2 + b * 3 + 1;\n")
+    return ''.join("int e%d(int a, int b) {\n%s}\n" % (i, body) for i in range(n)) + \
+        "int main() {\n    return e0(1, 2);\n}\n"
+
+
+def bench_types(args):
+    """ Semantic analysis of expression-heavy code: time, memory it adds
+        to the tree and number of distinct expression Type objects, which
+        are shared by hash-consing.
+    """
+    from uc_parser import UCParser
+    from uc_sema import Visitor
+    from uc_ast2 import walk, Type
+    parser = UCParser()
+    code = _expressions(args.size)
+    times = []
+    for _ in range(args.repeat):
+        ast = parser.parse(code, '', False)
+        t = time.perf_counter()
+        Visitor(False).visit(ast)
+        times.append(time.perf_counter() - t)
+    ast = parser.parse(code, '', False)
+    gc.collect()
+    tracemalloc.start()
+    Visitor(False).visit(ast)
+    gc.collect()
+    added = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    types = []
+
+    def collect(node, name, depth):
+        if not isinstance(node, Type) and isinstance(getattr(node, 'type', None), Type):
+            types.append(node.type)
+    walk(ast, collect)
+    _report("sema", median(times) * 1000, "ms")
+    _report("memory added by sema", added / 2 ** 20, "MB")
+    _report("typed nodes", len(types), "")
+    _report("distinct Type objects", len(set(map(id, types))), "")
+
+
+def bench_dump(args):
+    """ Time to write the AST of a synthetic source to a file as text,
+        with show(), and as JSON Lines, next to the time to parse it.
+    """
+    from uc_parser import UCParser
+    from uc_ast2 import dump_jsonl
+    parser = UCParser()
+    code = _synthetic(args.size)
+    t_parse = _timeit(lambda: parser.parse(code, '', False), args.repeat)
+    ast = parser.parse(code, '', False)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'dump')
+
+        def write(func):
+            with open(filename, 'w', buffering=1 << 20) as f:
+                func(f)
+
+        t_text = _timeit(lambda: write(lambda f: ast.show(buf=f, showcoord=True)), args.repeat)
+        text_size = os.path.getsize(filename)
+        t_jsonl = _timeit(lambda: write(lambda f: dump_jsonl(ast, f)), args.repeat)
+        jsonl_size = os.path.getsize(filename)
+    _report("parse", t_parse * 1000, "ms")
+    _report("text dump", t_text * 1000, "ms")
+    _report("text size", text_size / 2 ** 20, "MB")
+    _report("jsonl dump", t_jsonl * 1000, "ms")
+    _report("jsonl size", jsonl_size / 2 ** 20, "MB")
+
+
+def bench_astcache(args):
+    """ Parse and semantic analysis of a synthetic source versus loading
+        its checked AST from the cache.
+    """
+    from uc_parser import UCParser
+    from uc_sema import Visitor
+    from uc_cache import cache_dir, store, fetch
+    parser = UCParser()
+    code = _synthetic(args.size)
+
+    def check():
+        ast = parser.parse(code, '', False)
+        Visitor(False).visit(ast)
+        return ast
+
+    t_check = _timeit(check, args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['UC_CACHE_DIR'] = tmp
+        try:
+            store('bench', check())
+            size = os.path.getsize(os.path.join(cache_dir(), 'bench'))
+            t_load = _timeit(lambda: fetch('bench'), args.repeat)
+        finally:
+            del os.environ['UC_CACHE_DIR']
+    _report("parse and check", t_check * 1000, "ms")
+    _report("load from cache", t_load * 1000, "ms")
+    _report("speedup", t_check / t_load, "x")
+    _report("cache entry", size / 2 ** 20, "MB")
+
+
+_startup_script = """
+import sys, time
+t = time.perf_counter()
+from uc_parser import UCParser
+UCParser().parse(open(sys.argv[1]).read(), '', False)
+print(time.perf_counter() - t)
+"""
+
+
+def bench_startup(args):
+    """ Latency of a fresh process that imports the parser and parses
+        one file, with an empty (cold) and a populated (warm) table cache.
+    """
+    filename = _sources(args)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, UC_CACHE_DIR=tmp)
+
+        def run():
+            out = subprocess.run([sys.executable, '-c', _startup_script, filename], cwd=_here, env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+            return float(out.stdout.decode().split()[-1])
+
+        cold = run()
+        warm = median(run() for _ in range(args.repeat))
+    _report("cold parse (no tables)", cold * 1000, "ms")
+    _report("warm parse (cached tables)", warm * 1000, "ms")
+    _report("speedup", cold / warm, "x")
+
+
+def bench_reuse(args):
+    """ Per-file cost of parsing every source with a fresh parser versus
+        one long-lived parser instance.
+    """
+    from uc_parser import UCParser
+    sources = [open(f).read() for f in _sources(args)]
+    UCParser()
+
+    def fresh():
+        for code in sources:
+            UCParser().parse(code, '', False)
+
+    parser = UCParser()
+
+    def reused():
+        for code in sources:
+            parser.parse(code, '', False)
+
+    t_fresh = _timeit(fresh, args.repeat) / len(sources)
+    t_reused = _timeit(reused, args.repeat) / len(sources)
+    _report("fresh parser per file", t_fresh * 1000, "ms")
+    _report("reused parser per file", t_reused * 1000, "ms")
+    _report("speedup", t_fresh / t_reused, "x")
+
+
+def bench_reductions(args):
+    """ Reductions per second of the plain grammar actions on a large
+        synthetic source.
+    """
+    from uc_parser import UCParser
+    parser = UCParser()
+    code = _synthetic(args.size)
+    reductions = _count_reductions(parser, code)
+    elapsed = _timeit(lambda: parser.parse(code, '', False), args.repeat)
+    _report("reductions", reductions, "")
+    _report("parse time", elapsed * 1000, "ms")
+    _report("reductions per second", reductions / elapsed / 1e6, "M/s")
+
+
+_scaling_sizes = (10000, 100000, 1000000)
+
+_scaling_inputs = {
+    'globals': lambda n: ''.join('int g%d;\n' % i for i in range(n)),
+    'statements': lambda n: 'void main() {\n    int x;\n' + '    x = 1;\n' * n + '}\n',
+}
+
+
+def bench_scaling(args):
+    """ Parse time per item of translation units with 10k, 100k and 1M
+        global declarations or block items. List-building productions
+        must be amortized O(1), so the time per item has to stay flat.
+    """
+    from uc_parser import UCParser
+    parser = UCParser()
+    linear = True
+    for name, make in sorted(_scaling_inputs.items()):
+        per_item = []
+        for n in _scaling_sizes:
+            code = make(n)
+            per_item.append(_timeit(lambda: parser.parse(code, '', False), 1) / n)
+            _report("%s %d" % (name, n), per_item[-1] * 1e6, "us/item")
+            del code
+        growth = per_item[-1] / per_item[0]
+        _report("%s growth" % name, growth, "x")
+        linear = linear and growth < 2.0
+    print("time grows linearly" if linear else "time grows faster than linearly")
+    return 0 if linear else 1
+
+
+_nested_inputs = {
+    'expression': lambda n: 'int main() {\n    int a = 1;\n    int b = ' + ' + '.join(['a'] * n) + ';\n    return 0;\n}\n',
+    'if': lambda n: 'int main() {\n    int a = 1;\n    ' + 'if (a == 1) ' * n + 'a = 2;\n    return 0;\n}\n',
+    'compound': lambda n: 'int main() {\n    int a = 1;\n    ' + '{ ' * n + 'a = 2; ' + '} ' * n + '\n    return 0;\n}\n',
+}
+
+
+class _Sink(object):
+    """ File-like object that only counts what is written to it. """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+def bench_depth(args):
+    """ Semantic check, code generation and show() of programs nested ten
+        times deeper than the recursion limit. The visitors run on an
+        explicit stack, so none of them may raise RecursionError.
+    """
+    from uc_parser import UCParser
+    from uc_sema import Visitor
+    from uc_code2 import GenerateCode
+    parser = UCParser()
+    depth = 10 * sys.getrecursionlimit()
+    failed = False
+    for name, make in sorted(_nested_inputs.items()):
+        ast = parser.parse(make(depth), '', False)
+        for stage, run in (('show', lambda: ast.show(buf=_Sink())),
+                           ('sema', lambda: Visitor(False).visit(ast)),
+                           ('codegen', lambda: GenerateCode(False).visit(ast))):
+            t = time.perf_counter()
+            try:
+                run()
+            except RecursionError:
+                print("%s %s: RecursionError" % (name, stage))
+                failed = True
+                break
+            _report("%s %s" % (name, stage), (time.perf_counter() - t) * 1000, "ms")
+    print("depth %d" % depth + (" failed" if failed else " ok"))
+    return 1 if failed else 0
+
+
+BENCHMARKS = {
+    'depth': bench_depth,
+    'dump': bench_dump,
+    'errors': bench_errors,
+    'astcache': bench_astcache,
+    'children': bench_children,
+    'hashes': bench_hashes,
+    'index': bench_index,
+    'lexers': bench_lexers,
+    'operators': bench_operators,
+    'packed': bench_packed,
+    'parallel': bench_parallel,
+    'pipeline': bench_pipeline,
+    'scaling': bench_scaling,
+    'reductions': bench_reductions,
+    'reparse': bench_reparse,
+    'reuse': bench_reuse,
+    'scopes': bench_scopes,
+    'sema': bench_sema,
+    'startup': bench_startup,
+    'stream': bench_stream,
+    'tokens': bench_tokens,
+    'types': bench_types,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("filename", nargs='?', help="uC source to use instead of Files/*.uc")
+    parser.add_argument("-n", "--size", type=int, default=2000, help="size of the synthetic sources")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of timed repetitions")
+    args = parser.parse_args()
+    sys.exit(BENCHMARKS[args.benchmark](args))
@@ -82,6 +82,14 @@ def format_instruction(t):
     else:
         return f"{op}"
 
+def write_code(code, buf):
+    """ Writes the instructions of code to buf, one per line, as
+        format_instruction() prints them.
+    """
+    lines = (format_instruction(inst) for inst in code)
+    buf.write(''.join(line + '\n' for line in lines if line is not None))
+
+
 class CFG(object):
     def __init__(self, fname):
         self.fname = fname
@@ -0,0 +1,168 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_cache.py
+#
+# Helpers for the on-disk cache of the uc compiler. Generated artifacts (the PLY
+# lexer and LALR tables) are written into a single cache directory and versioned
+# by a hash of the sources they were generated from, so a stale artifact is never
+# loaded after the compiler itself has been edited.
+#
+# Checked programs are pickled into the same directory by store() and read back
+# by fetch(), keyed by the hash of their source and of the compiler, and trim()
+# keeps them within a size quota.
+#
+# The cache directory defaults to '__uccache__' next to this file and can be
+# moved with the UC_CACHE_DIR environment variable. It is created private to the
+# user, and nothing is loaded from it unless both the directory and the entry
+# belong to the user and nobody else can write to them: loading a pickle or a
+# table module runs code, which another user must not be able to plant.
+# ---------------------------------------------------------------------------------
+import gc
+import os
+import pickle
+import hashlib
+import importlib.util
+from functools import partial
+from contextlib import contextmanager
+
+
+def cache_dir():
+    """ Returns the cache directory, creating it if needed. """
+    path = os.environ.get('UC_CACHE_DIR') or \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '__uccache__')
+    try:
+        os.makedirs(path, 0o700, exist_ok=True)
+    except OSError:
+        pass
+    return path
+
+
+def trusted(path):
+    """ Returns whether path exists, belongs to the user and can only be
+        written by the user.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if hasattr(os, 'getuid'):
+        return st.st_uid == os.getuid() and not st.st_mode & 0o022
+    return True
+
+
+def source_hash(*filenames, extra=''):
+    """ Returns a short hex digest of the contents of the given files. """
+    h = hashlib.sha1(extra.encode('utf-8'))
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            for block in iter(partial(f.read, 1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def load_module(name):
+    """ Imports the cached python module 'name' straight from the cache
+        directory. Returns None if it was not generated yet.
+    """
+    path = os.path.join(cache_dir(), name + '.py')
+    if not trusted(cache_dir()) or not trusted(path):
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        return None
+    return module
+
+
+def prune(prefix, keep):
+    """ Removes the cache entries starting with 'prefix', except 'keep'. """
+    path = cache_dir()
+    for entry in os.listdir(path):
+        if entry.startswith(prefix) and not entry.startswith(keep):
+            try:
+                os.remove(os.path.join(path, entry))
+            except OSError:
+                pass
+
+
+def trim(prefix, quota):
+    """ Removes the least recently used cache entries starting with
+        'prefix' until they take at most quota bytes.
+    """
+    path = cache_dir()
+    entries = []
+    for entry in os.listdir(path):
+        if entry.startswith(prefix):
+            try:
+                st = os.stat(os.path.join(path, entry))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry))
+    size = sum(entry[1] for entry in entries)
+    for _, entry_size, entry in sorted(entries):
+        if size <= quota:
+            break
+        try:
+            os.remove(os.path.join(path, entry))
+        except OSError:
+            continue
+        size -= entry_size
+
+
+@contextmanager
+def gc_paused():
+    """ Pauses the cyclic garbage collector. Building or loading a large
+        tree allocates many objects but no garbage, and each collection
+        would scan the whole tree again.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def store(name, obj):
+    """ Pickles obj into the cache entry 'name'. Returns False if obj
+        could not be pickled, or the cache directory is not trusted().
+    """
+    if not trusted(cache_dir()):
+        return False
+    path = os.path.join(cache_dir(), name)
+    temp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with os.fdopen(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f, gc_paused():
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        if os.path.exists(temp):
+            os.remove(temp)
+        return False
+    return True
+
+
+def fetch(name):
+    """ Returns the object stored in the cache entry 'name', or None. The
+        entry is only loaded if it and the directory are trusted(), and is
+        then marked as used for trim().
+    """
+    path = os.path.join(cache_dir(), name)
+    if not trusted(cache_dir()) or not trusted(path):
+        return None
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f, gc_paused():
+        try:
+            obj = pickle.load(f)
+        except Exception:
+            return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return obj
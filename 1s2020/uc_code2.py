@@ -1,3 +1,4 @@
+import sys
 from uc_sema import *
 from uc_ast2 import *
 from uc_block2 import *
@@ -23,12 +24,9 @@ class GenerateCode(NodeVisitor):
         self.text = []
         self.code = []
 
-        self.binary_opcodes = {"+": "add", "-": "sub", "*": "mul", "/": "div", "%": "mod",
-                               "==": "eq", "!=": "ne", "<": "lt", ">": "gt", "<=": "le", ">=": "ge", "&&": "and",
-                               "||": "or"}
-        self.unary_opcodes = {"-": "sub", "+": "", "--": "sub", "++": "add", "p--": "sub", "p++": "add", "!": "not",
-                              "*": "", "&": ""}
-        self.assign_opcodes = {"+=": "add", "-=": "sub", "*=": "mul", "/=": "div", "%=": "mod"}
+        self.binary_opcodes = binary_opcodes
+        self.unary_opcodes = unary_opcodes
+        self.assign_opcodes = assign_opcodes
 
         self.alloc_phase = None
 
@@ -38,6 +36,17 @@ class GenerateCode(NodeVisitor):
         self.ret_label = None
         self.ret_block = None
 
+    def emit(self, decl):
+        '''
+        Returns the instructions of the CFG of a FuncDef or GlobalDecl, block by block.
+        '''
+        block = EmitBlocks()
+        block.visit(decl.cfg)
+        return block.code
+
+    def show(self, buf=sys.stdout):
+        write_code(self.code, buf)
+
     def clean(self):
         self.items = []
 
@@ -85,16 +94,15 @@ class GenerateCode(NodeVisitor):
                     block.fall = newBlock
         self.currentBlock = newBlock
 
-    def visit(self, node):
-        method = 'visit_' + node.__class__.__name__
-        return getattr(self, method, self.generic_visit)(node)
-
     def generic_visit(self, node):
         # ~ print('generic:', type(node))
         if node is None:
             return ''
         else:
-            return ''.join(self.visit(c) for c_name, c in node.children())
+            parts = []
+            for c_name, c in node.children():
+                parts.append((yield c))
+            return ''.join(parts)
 
     def visit_Constant(self, node):
         # print("Constant")
@@ -130,7 +138,7 @@ class GenerateCode(NodeVisitor):
             if node.expr[0] is not None:
                 if isinstance(node.expr[0], ExprList):
                     for _expr in node.expr[0].exprs:
-                        self.visit(_expr)
+                        yield _expr
                         if isinstance(_expr, ID) or isinstance(_expr, ArrayRef):
                             self._loadLocation(_expr)
                         elif isinstance(_expr, UnaryOp) and _expr.op == "*":
@@ -140,7 +148,7 @@ class GenerateCode(NodeVisitor):
                         self.currentBlock.append(inst)
                 else:
                     _expr = node.expr[0]
-                    self.visit(_expr)
+                    yield _expr
                     if isinstance(_expr, ID) or isinstance(_expr,ArrayRef):
                         self._loadLocation(_expr)
                     elif isinstance(_expr, UnaryOp) and _expr.op == "*":
@@ -157,21 +165,20 @@ class GenerateCode(NodeVisitor):
         # print("Program")
 
         for _decl in node.gdecls:
-            self.visit(_decl)
+            yield _decl
 
         self.code = self.text.copy()
         node.text = self.text.copy()
 
         if len(self.globalBlock.instructions) > 0:
-            node.gdecls.append(GlobalDecl(decls=None, cfg=self.globalBlock))
+            _glob = GlobalDecl(decls=None, cfg=self.globalBlock)
+            node.gdecls.append(_glob)
+            if node.node_index is not None:
+                node.node_index.add(_glob)
 
         for _decl in node.gdecls:
             if isinstance(_decl, FuncDef) or isinstance(_decl, GlobalDecl):
-                block = EmitBlocks()
-                block.visit(_decl.cfg)
-                for _code in block.code:
-                    self.code.append(_code)
-                    # self.currentBlock.instructions.append(_code)
+                self.code.extend(self.emit(_decl))
 
         if self.cfg:
             for _decl in node.gdecls:
@@ -185,12 +192,12 @@ class GenerateCode(NodeVisitor):
         # print("ArrayRef:")
 
         _subs_a = node.subscript
-        self.visit(_subs_a)
+        yield _subs_a
         if isinstance(node.name, ArrayRef):
             _subs_b = node.name.subscript
-            self.visit(_subs_b)
+            yield _subs_b
             _dim = node.name.name.bind.type.dim
-            self.visit(_dim)
+            yield _dim
             if isinstance(_subs_b, ID) or isinstance(_subs_b, ArrayRef):
                 self._loadLocation(_subs_b)
             _target = self.new_temp()
@@ -224,7 +231,7 @@ class GenerateCode(NodeVisitor):
             if isinstance(node.args, ExprList):
                 _tcode = []
                 for _arg in node.args.exprs:
-                    self.visit(_arg)
+                    yield _arg
                     if isinstance(_arg, ID) or isinstance(_arg, ArrayRef):
                         self._loadLocation(_arg)
                     inst = ('param_' + _arg.type.names[-1].typename, _arg.gen_location)
@@ -234,7 +241,7 @@ class GenerateCode(NodeVisitor):
                     self.currentBlock.append(_inst)
 
             else:
-                self.visit(node.args)
+                yield node.args
                 if isinstance(node.args, ID) or isinstance(node.args, ArrayRef):
                     self._loadLocation(node.args)
                 inst = ('param_' + node.args.type.names[-1].typename, node.args.gen_location)
@@ -250,7 +257,7 @@ class GenerateCode(NodeVisitor):
             self.currentBlock.instructions.append(('call', _target, node.gen_location))
         else:
             node.gen_location = self.new_temp()
-            self.visit(node.name)
+            yield node.name
             inst = ('call_' + node.name.type.names[-1].typename, '@' + node.name.gen_location, node.gen_location)
             # self.code.append(inst)
             self.currentBlock.append(inst)
@@ -258,7 +265,7 @@ class GenerateCode(NodeVisitor):
     def visit_UnaryOp(self, node):
         # print("UnaryOp:")
 
-        self.visit(node.expr)
+        yield node.expr
         _source = node.expr.gen_location
 
         if node.op == '&' or node.op == '*':
@@ -277,7 +284,7 @@ class GenerateCode(NodeVisitor):
 
             elif node.op == '-':
                 _typename = node.expr.type.names[-1].typename
-                opcode = self.unary_opcodes[node.op] + "_" + _typename
+                opcode = unary_operation(node.op, node.expr.type.names[-1]).opcode
                 _aux = self.new_temp()
                 self.code.append(('literal_' + _typename, 0, _aux))
                 self.currentBlock.instructions.append(('literal_' + _typename, 0, _aux))
@@ -294,7 +301,7 @@ class GenerateCode(NodeVisitor):
                 _value = self.new_temp()
                 self.code.append(('literal_int', _val, _value))
                 self.currentBlock.instructions.append(('literal_int', _val, _value))
-                opcode = self.unary_opcodes[node.op] + "_" + node.expr.type.names[-1].typename
+                opcode = unary_operation(node.op, node.expr.type.names[-1]).opcode
                 node.gen_location = self.new_temp()
                 inst = (opcode, node.expr.gen_location, _value, node.gen_location)
                 self.code.append(inst)
@@ -309,8 +316,8 @@ class GenerateCode(NodeVisitor):
     def visit_BinaryOp(self, node):
         # print("BinaryOp:")
 
-        self.visit(node.left)
-        self.visit(node.right)
+        yield node.left
+        yield node.right
 
         if isinstance(node.left, ID) or isinstance(node.left, ArrayRef):
             self._loadLocation(node.left)
@@ -324,7 +331,7 @@ class GenerateCode(NodeVisitor):
 
         target = self.new_temp()
 
-        opcode = self.binary_opcodes[node.op] + "_" + node.left.type.names[-1].typename
+        opcode = binary_operation(node.op, node.left.type.names[-1], node.right.type.names[-1]).opcode
         inst = (opcode, node.left.gen_location, node.right.gen_location, target)
         self.code.append(inst)
         self.currentBlock.instructions.append(inst)
@@ -332,7 +339,7 @@ class GenerateCode(NodeVisitor):
         node.gen_location = target
 
     def _storeLocation(self, typename, init, target, operation):
-        self.visit(init)
+        yield init
         if isinstance(init, ID) or isinstance(init, ArrayRef):
             self._loadLocation(init)
         elif isinstance(init, UnaryOp) and init.op == "*":
@@ -364,7 +371,7 @@ class GenerateCode(NodeVisitor):
         # print("Assert:")
 
         _expr = node.expr
-        self.visit(_expr)
+        yield _expr
 
         self.changeCurrentBlock()
 
@@ -385,9 +392,7 @@ class GenerateCode(NodeVisitor):
         self.currentBlock.next_block = falseBlock
         self.currentBlock = falseBlock
         _target = self.new_text()
-        _tempExp = _expr.coord.split('@')
-        _tempCoord = _tempExp[1].split(':')
-        inst = ('global_string', _target, "assertion_fail on " + f"{_tempCoord[0]}:{_tempCoord[1]}")
+        inst = ('global_string', _target, f"assertion_fail on  {_expr.coord.line}:{_expr.coord.column}")
         self.text.append(inst)
         self.currentBlock.instructions.append(('print_str', _target))
         self.currentBlock.instructions.append(('jump', self.ret_block.label))
@@ -401,13 +406,13 @@ class GenerateCode(NodeVisitor):
         # print("Assignment:")
 
         _rval = node.rvalue
-        self.visit(_rval)
+        yield _rval
         if isinstance(_rval, ID) or isinstance(_rval, ArrayRef):
             self._loadLocation(_rval)
         elif isinstance(_rval, UnaryOp) and _rval.op == "*":
             self._loadReference(_rval)
         _lvar = node.lvalue
-        self.visit(_lvar)
+        yield _lvar
         if node.op in self.assign_opcodes:
             _lval = self.new_temp()
             _target = self.new_temp()
@@ -417,7 +422,7 @@ class GenerateCode(NodeVisitor):
             inst = ('load_' + _typename, _lvar.gen_location, _lval)
             self.code.append(inst)
             self.currentBlock.instructions.append(inst)
-            inst = (self.assign_opcodes[node.op] + '_' + _lvar.type.names[-1].typename,
+            inst = (assign_operation(node.op, _lvar.type.names[-1]).opcode,
                     node.rvalue.gen_location, _lval, _target)
             self.code.append(inst)
             self.currentBlock.instructions.append(inst)
@@ -457,24 +462,24 @@ class GenerateCode(NodeVisitor):
         _type = node.type
         _dim = ""
         if isinstance(_type, VarDecl):
-            self.visit_VarDecl(_type, node, _dim)
+            yield from self.visit_VarDecl(_type, node, _dim)
         elif isinstance(_type, ArrayDecl):
-            self.visit_ArrayDecl(_type, node, _dim)
+            yield from self.visit_ArrayDecl(_type, node, _dim)
         elif isinstance(_type, PtrDecl):
-            self.visit_PtrDecl(_type, node, _dim)
+            yield from self.visit_PtrDecl(_type, node, _dim)
         elif isinstance(_type, FuncDecl):
-            self.visit_FuncDecl(_type)
+            yield from self.visit_FuncDecl(_type)
 
     def visit_DeclList(self, node):
         # print("DeclList:")
 
         for decl in node.decls:
-            self.visit(decl)
+            yield decl
 
     def visit_Cast(self, node):
         # print("Cast:")
 
-        self.visit(node.expr)
+        yield node.expr
         if isinstance(node.expr, ID) or isinstance(node.expr, ArrayRef):
             self._loadLocation(node.expr)
         _temp = self.new_temp()
@@ -495,7 +500,7 @@ class GenerateCode(NodeVisitor):
         node.value = []
         for _expr in node.exprs:
             if isinstance(_expr, InitList):
-                self.visit(_expr)
+                yield _expr
             node.value.append(_expr.value)
 
     def visit_FuncDef(self, node):
@@ -513,20 +518,20 @@ class GenerateCode(NodeVisitor):
         node.cfg = self.currentBlock
 
         self.alloc_phase = None
-        self.visit(node.decl)
+        yield node.decl
 
         if node.body is not None:
             self.alloc_phase = "var_decl"
             for _body in node.body:
                 if isinstance(_body, Decl):
-                    self.visit(_body)
+                    yield _body
             for _decl in node.decls:
-                self.visit(_decl)
+                yield _decl
 
         if node.decl.type.args is not None:
             self.alloc_phase = 'arg_init'
             for _arg in node.decl.type.args:
-                self.visit(_arg)
+                yield _arg
 
         if _funcType == 'void':
             self.code.append(('return_void',))
@@ -543,14 +548,14 @@ class GenerateCode(NodeVisitor):
         if node.body is not None:
             self.alloc_phase = 'var_init'
             for _body in node.body:
-               self.visit(_body)
+               yield _body
 
 
     def visit_Compound(self, node):
         # print("Compound:")
 
         for item in node.block_items:
-            self.visit(item)
+            yield item
 
     def visit_EmptyStatement(self, node):
         pass
@@ -559,13 +564,13 @@ class GenerateCode(NodeVisitor):
         # print("ParamList:")
 
         for _par in node.params:
-            self.visit(_par)
+            yield _par
 
     def visit_Read(self, node):
         # print("Read:")
 
         for _loc in node.names:
-            self.visit(_loc)
+            yield _loc
 
             if isinstance(_loc, ID) or isinstance(_loc, ArrayRef):
                 self._readLocation(_loc)
@@ -573,7 +578,7 @@ class GenerateCode(NodeVisitor):
                 self._readLocation(_loc)
             elif isinstance(_loc, ExprList):
                 for _var in _loc.exprs:
-                    self.visit(_var)
+                    yield _var
                     self._readLocation(_var)
 
     def visit_Return(self, node):
@@ -608,7 +613,7 @@ class GenerateCode(NodeVisitor):
         exit_label = self.new_temp()
 
         self.changeCurrentBlock()
-        self.visit(node.cond)
+        yield node.cond
 
         # trueBlock = BasicBlock('%if.then_' + true_label)
         trueBlock = BasicBlock(true_label)
@@ -636,7 +641,7 @@ class GenerateCode(NodeVisitor):
         self.currentBlock.next_block = trueBlock
         self.currentBlock = trueBlock
 
-        self.visit(node.iftrue)
+        yield node.iftrue
 
         if len(self.currentBlock.instructions) > 0:
             if self.currentBlock.generateJump():
@@ -650,7 +655,7 @@ class GenerateCode(NodeVisitor):
             self.currentBlock = falseBlock
             # self.code.append(('jump', exit_label))
             # self.code.append((false_label[1:],))
-            self.visit(node.iffalse)
+            yield node.iffalse
             if self.currentBlock.generateJump():
                 self.currentBlock.append(('jump', exitBlock.label))
                 self.currentBlock.branch = exitBlock
@@ -668,7 +673,7 @@ class GenerateCode(NodeVisitor):
     def visit_For(self, node):
         # print("For:")
 
-        self.visit(node.init)
+        yield node.init
 
         increase_label = self.new_temp()
         body_label = self.new_temp()
@@ -692,7 +697,7 @@ class GenerateCode(NodeVisitor):
         self.currentBlock.branch = conditionBlock
         conditionBlock.predecessors.add(self.currentBlock)
         self.currentBlock = conditionBlock
-        self.visit(node.cond)
+        yield node.cond
         inst = ('cbranch', node.cond.gen_location, bodyBlock.label, exitBlock.label)
         # self.code.append(inst)
         self.currentBlock.append(inst)
@@ -705,7 +710,7 @@ class GenerateCode(NodeVisitor):
         self.currentBlock = bodyBlock
 
         # self.code.append((body_label[1:],))
-        self.visit(node.stmt)
+        yield node.stmt
         if len(self.currentBlock.instructions) > 0 and self.currentBlock.instructions[-1][0] != 'jump':
             self.currentBlock.instructions.append(('jump', increaseBlock.label))
             self.currentBlock.branch = increaseBlock
@@ -713,7 +718,7 @@ class GenerateCode(NodeVisitor):
 
         self.currentBlock.next_block = increaseBlock
         self.currentBlock = increaseBlock
-        self.visit(node.next)
+        yield node.next
         if len(self.currentBlock.instructions) > 0 and  self.currentBlock.instructions[-1][0] != 'jump':
             self.currentBlock.instructions.append(('jump', conditionBlock.label))
             self.currentBlock.branch = conditionBlock
@@ -748,7 +753,7 @@ class GenerateCode(NodeVisitor):
         whileBlock.predecessors.add(self.currentBlock)
 
         self.currentBlock = whileBlock
-        self.visit(node.cond)
+        yield node.cond
         inst = ('cbranch', node.cond.gen_location, bodyBlock.label, exitBlock.label)
         # self.code.append(inst)
         self.currentBlock.append(inst)
@@ -762,7 +767,7 @@ class GenerateCode(NodeVisitor):
         self.currentBlock = bodyBlock
 
         if node.stmt is not None:
-            self.visit(node.stmt)
+            yield node.stmt
         if len(self.currentBlock.instructions) > 0:
             if self.currentBlock.generateJump():
                 self.currentBlock.instructions.append(('jump', whileBlock.label))
@@ -811,7 +816,7 @@ class GenerateCode(NodeVisitor):
         self.alloc_phase = 'arg_decl'
         if node.args is not None:
             for _arg in node.args:
-                self.visit(_arg)
+                yield _arg
 
     def visit_ArrayDecl(self, node, decl, dim):
         # print("ArrayDecl:")
@@ -824,7 +829,7 @@ class GenerateCode(NodeVisitor):
                 dim += "_" + str(_type.dim.value)
             elif isinstance(_type, PtrDecl):
                 dim += "_*"
-        self.visit_VarDecl(_type, decl, dim)
+        yield from self.visit_VarDecl(_type, decl, dim)
 
     def visit_PtrDecl(self, node, decl, dim):
         _type = node
@@ -835,7 +840,7 @@ class GenerateCode(NodeVisitor):
                 dim += "_*"
             elif isinstance(_type, ArrayDecl):
                 dim += "_" + str(_type.dim.value)
-        self.visit_VarDecl(_type, decl, dim)
+        yield from self.visit_VarDecl(_type, decl, dim)
 
     def visit_GlobalDecl(self, node):
         # print("GlobalDecl:")
@@ -844,7 +849,7 @@ class GenerateCode(NodeVisitor):
 
         for _decl in node.decls:
             if not isinstance(_decl.type, FuncDecl):
-                self.visit(_decl)
+                yield _decl
         self.currentScope = 0
 
     def _globalLocation(self, node, decl, dim):
@@ -859,7 +864,7 @@ class GenerateCode(NodeVisitor):
             self.text.append(('global_' + _type, _varname, decl.init.value))
             self.globalBlock.instructions.append(('global_' + _type, _varname, [(_type, decl.init.value)]))
         elif isinstance(decl.init, InitList):
-            self.visit(decl.init)
+            yield decl.init
             self.text.append(('global_' + _type, _varname, decl.init.value))
             self.globalBlock.instructions.append(('global_' + _type, _varname, decl.init.value))
         node.declname.gen_location = _varname
@@ -877,7 +882,7 @@ class GenerateCode(NodeVisitor):
         node.gen_location = _varname
 
     def _storeLocation(self, typename, init, target):
-        self.visit(init)
+        yield init
         if isinstance(init, ID) or isinstance(init, ArrayRef):
             self._loadLocation(init)
         elif isinstance(init, UnaryOp) and init.op == '*':
@@ -890,7 +895,7 @@ class GenerateCode(NodeVisitor):
         # print("VarDecl:")
 
         if isinstance(node.declname.bind, ArrayDecl) or node.declname.scope == 1:
-            self._globalLocation(node, decl, dim)
+            yield from self._globalLocation(node, decl, dim)
         else:
             _typename = node.type.names[-1].typename + dim
             if self.alloc_phase == 'arg_decl' or self.alloc_phase == 'var_decl':
@@ -910,4 +915,4 @@ class GenerateCode(NodeVisitor):
                 self.currentBlock.instructions.append(inst)
             elif self.alloc_phase == 'var_init':
                 if decl.init is not None:
-                    self._storeLocation(_typename, decl.init, node.declname.gen_location)
+                    yield from self._storeLocation(_typename, decl.init, node.declname.gen_location)
@@ -1,5 +1,48 @@
+import re
+import copy
+from functools import partial
+from array import array
+from bisect import bisect_right
 import ply.lex as lex
 
+_newline = re.compile('\n')
+_newline_bytes = re.compile(b'\n')
+_non_ascii = re.compile(b'[\x80-\xff]')
+_continuation_bytes = bytes(range(0x80, 0xc0))
+
+# One UTF-8 encoded character, other than a newline.
+_utf8_char = r'(?:[^\n\x80-\xff]|[\xc0-\xff][\x80-\xbf]*)'
+
+
+def utf8_pattern(pattern, flags=0):
+    """ Compiles the str regex pattern to match the UTF-8 encoding of what
+        it matches: each '.' outside a character class becomes one whole
+        encoded character, where it would otherwise match a single byte.
+    """
+    out = []
+    pos = 0
+    while pos < len(pattern):
+        c = pattern[pos]
+        if c == '\\':
+            out.append(pattern[pos:pos + 2])
+            pos += 2
+            continue
+        if c == '[':
+            end = pos + 1
+            if pattern[end:end + 1] == '^':
+                end += 1
+            if pattern[end:end + 1] == ']':
+                end += 1
+            while pattern[end] != ']':
+                end += 2 if pattern[end] == '\\' else 1
+            out.append(pattern[pos:end + 1])
+            pos = end + 1
+            continue
+        out.append(_utf8_char if c == '.' else c)
+        pos += 1
+    return re.compile(''.join(out).encode('ascii'), flags)
+
+
 class UCLexer:
     keywords = ('ASSERT', 'BREAK', 'PRINT', 'READ', 'FOR', 'RETURN', 'WHILE', 'IF', 'ELSE',
                 'VOID', 'INT', 'FLOAT', 'CHAR')
@@ -63,17 +106,64 @@ class UCLexer:
         self.error_func = error_func
         self.filename = ''
         self.last_token = None
+        self.line_starts = array('L', [0])
+        self._newlines = iter(())
+        self._encoded = None
+        self._counted = (0, 0, 0)
+
+    def build(self, engine='ply', **kwargs):
+        """ Builds the lexer engine: 'ply' for PLY's lexer (kwargs are passed
+            to lex.lex) or 'scanner' for the precompiled Scanner below.
+        """
+        self.engine = engine
+        if engine == 'scanner':
+            self.lexer = Scanner(self)
+        else:
+            self.lexer = lex.lex(module=self, **kwargs)
 
-    def build(self, **kwargs):
-        self.lexer = lex.lex(module=self, **kwargs)
+    def clone(self, error_func=None):
+        """ Returns a copy of this lexer, with its own input state, that
+            reports errors to error_func.
+        """
+        other = copy.copy(self)
+        other.error_func = error_func or self.error_func
+        other.last_token = None
+        other.lexer = self.lexer.clone(other)
+        if self.engine == 'ply':
+            other.lexer.begin('INITIAL')
+        return other
 
     def reset_lineno(self):
         """ Resets the internal line number counter of the lexer.
         """
         self.lexer.lineno = 1
 
-    def input(self, text):
+    def reset(self, text):
+        """ Starts lexing a new source: resets the line number and the last
+            token, and starts the index of the offsets where lines start,
+            which find_column() extends as it goes. The 'scanner' engine
+            also takes UTF-8 bytes or a mmap, and then positions are byte
+            offsets (columns still count characters).
+        """
         self.lexer.input(text)
+        self.lexer.lineno = 1
+        self.start_lines(text)
+
+    def start_lines(self, text):
+        """ Starts the line index of text used by find_column(), without
+            lexing it (the parser does this when it replays a TokenBuffer).
+        """
+        self.last_token = None
+        newline = _newline if isinstance(text, str) else _newline_bytes
+        self.line_starts = array('L', [0])
+        self._newlines = newline.finditer(text)
+        # Byte offsets only give the column when every character before
+        # them on the line is one byte long.
+        self._encoded = None if isinstance(text, str) or not _non_ascii.search(text) else text
+        self._counted = (0, 0, 0)
+
+    def input(self, text):
+        self.reset(text)
         while True:
             tok = self.lexer.token()
             if not tok:
@@ -84,11 +174,46 @@ class UCLexer:
         self.last_token = self.lexer.token()
         return self.last_token
 
+    def tokenize(self, text):
+        """ Lexes text into a TokenBuffer. """
+        return TokenBuffer(self, text)
+
+    def find_column(self, lexpos):
+        """ Find the column of the position lexpos in its line, by a binary
+            search on the line index started by reset().
+        """
+        line_starts = self.line_starts
+        if lexpos >= line_starts[-1]:
+            for m in self._newlines:
+                line_starts.append(m.end())
+                if m.end() > lexpos:
+                    break
+        line_start = line_starts[bisect_right(line_starts, lexpos) - 1]
+        if self._encoded is not None:
+            return lexpos - line_start + 1 - self._continuations(line_start, lexpos)
+        return lexpos - line_start + 1
+
+    def _continuations(self, line_start, lexpos):
+        """ Returns the number of UTF-8 continuation bytes between
+            line_start and lexpos. The count is carried on from the last
+            position asked for on the same line, as the parser asks for the
+            columns of tokens close to each other.
+        """
+        text = self._encoded
+        start, pos, count = self._counted
+        if start != line_start:
+            pos, count = line_start, 0
+        if lexpos >= pos:
+            count += lexpos - pos - len(text[pos:lexpos].translate(None, _continuation_bytes))
+        else:
+            count -= pos - lexpos - len(text[lexpos:pos].translate(None, _continuation_bytes))
+        self._counted = (line_start, lexpos, count)
+        return count
+
     def find_tok_column(self, token):
         """ Find the column of the token in its line.
         """
-        last_cr = self.lexer.lexdata.rfind('\n', 0, token.lexpos)
-        return token.lexpos - last_cr
+        return self.find_column(token.lexpos)
 
     # Internal auxiliary methods
     def _error(self, msg, token):
@@ -145,5 +270,247 @@ class UCLexer:
 
     # Error handling rule
     def t_error(self, t):
-        print("Illegal character '%s'" % t.value[0])
+        self.illegal_char(t.value[0])
         t.lexer.skip(1)
+
+    def illegal_char(self, char):
+        print("Illegal character '%s'" % char)
+
+
+class Token(object):
+    """ A token of the Scanner. Same fields as PLY's LexToken ('lexer' is
+        only set by the parser on a syntax error).
+    """
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return "LexToken(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+
+
+class ByteToken(object):
+    """ A token scanned from bytes. It keeps the byte offsets of its lexeme
+        and only decodes it when the value is asked for, so tokens whose
+        value the grammar never reads cost no string.
+    """
+    __slots__ = ('type', 'lineno', 'lexpos', 'lexend', 'lexdata', 'lexer')
+
+    def __init__(self, type, lineno, lexpos, lexend, lexdata):
+        self.type = type
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.lexend = lexend
+        self.lexdata = lexdata
+
+    @property
+    def value(self):
+        return self.lexdata[self.lexpos:self.lexend].decode('utf-8')
+
+    def __repr__(self):
+        return "LexToken(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+
+
+class Scanner(object):
+    """ Alternative lexer engine for UCLexer. All token rules are compiled
+        into one master pattern, tried in the same order as PLY tries them,
+        so it yields the same tokens, line numbers and errors. The token
+        kind is then found in a table indexed by the matching group.
+
+        It implements the part of PLY's lexer interface used by UCLexer
+        and by the parser: input(), token(), lineno and clone().
+
+        The input may also be UTF-8 bytes or a mmap of a source file. It is
+        then matched in place, without decoding it, and yields ByteTokens.
+    """
+    _DISCARD, _ID = range(2)
+
+    _compiled = {}
+
+    def __init__(self, module):
+        self.module = module
+        self.lineno = 1
+        self.lexpos = 0
+        self.lexdata = ''
+        self._tokens = iter(())
+        self.master, self.master_bytes, self.kinds = self.patterns(type(module))
+
+    @classmethod
+    def patterns(cls, module):
+        """ Returns the master patterns (str and bytes) and the kind table of
+            the lexer class module, compiled once.
+        """
+        if module not in cls._compiled:
+            cls._compiled[module] = cls._compile(module)
+        return cls._compiled[module]
+
+    @classmethod
+    def _compile(cls, module):
+        # Function rules in definition order, then string rules by decreasing
+        # regex length: the order of PLY's master regex.
+        funcs, strings = [], []
+        for name in sorted(dir(module)):
+            rule = getattr(module, name)
+            if not name.startswith('t_') or name in ('t_ignore', 't_error'):
+                continue
+            if callable(rule):
+                funcs.append((name, rule.__doc__, rule.__code__.co_firstlineno))
+            else:
+                strings.append((name, rule))
+        funcs.sort(key=lambda f: f[2])
+        strings.sort(key=lambda s: len(s[1]), reverse=True)
+        # t_ID comes first and matches every keyword, so PLY never reaches the
+        # keyword string rules; leaving them out shortens every failed match.
+        keywords = set(module.keyword_map.values())
+        rules = [(name, regex) for name, regex, _ in funcs if name != 't_newline']
+        rules += [(name, regex) for name, regex in strings if name[2:] not in keywords]
+        # Ignored characters and newlines (t_newline) are consumed in front of
+        # the token they precede; _scan() counts the newlines.
+        master = re.compile('[%s\n]*(?:%s)' % (re.escape(module.t_ignore),
+                                               '|'.join('(?P<%s>%s)' % rule for rule in rules)), re.VERBOSE)
+
+        special = {'t_comment': cls._DISCARD, 't_ID': cls._ID}
+        kinds = [None] * (master.groups + 1)
+        for name, index in master.groupindex.items():
+            kinds[index] = special.get(name, name[2:])
+
+        return master, utf8_pattern(master.pattern, re.VERBOSE), kinds
+
+    def clone(self, module=None):
+        return Scanner(module or self.module)
+
+    def input(self, text):
+        self.lexdata = text
+        self.lexpos = 0
+        self._tokens = self._scan(text) if isinstance(text, str) else self._scan_bytes(text)
+        # Calls the generator straight from C, without a method frame per token.
+        self.token = partial(next, self._tokens, None)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def _illegal(self, text, start, end):
+        if not isinstance(text, str):
+            text = text[start:end].decode('utf-8', 'replace')
+            start, end = 0, len(text)
+        ignore = self.module.t_ignore + '\n'
+        for pos in range(start, end):
+            if text[pos] not in ignore:
+                self.module.illegal_char(text[pos])
+
+    def _scan(self, text):
+        kinds, keyword_map = self.kinds, self.module.keyword_map
+        DISCARD, ID = self._DISCARD, self._ID
+        lineno = self.lineno
+        pos = 0
+        for m in self.master.finditer(text):
+            if m.start() != pos:
+                self._illegal(text, pos, m.start())
+            index = m.lastindex
+            start, end = m.span(index)
+            lineno += text.count('\n', pos, start)
+            pos = end
+            kind = kinds[index]
+            if kind is DISCARD:
+                continue
+            value = text[start:end]
+            if kind is ID:
+                kind = keyword_map.get(value, 'ID')
+            yield Token(kind, value, lineno, start)
+        if pos != len(text):
+            self._illegal(text, pos, len(text))
+        self.lineno = lineno + text.count('\n', pos)
+        self.lexpos = len(text)
+
+    def _scan_bytes(self, data):
+        kinds = self.kinds
+        keyword_map = {k.encode('ascii'): v for k, v in self.module.keyword_map.items()}
+        DISCARD, ID = self._DISCARD, self._ID
+        lineno = self.lineno
+        pos = 0
+        for m in self.master_bytes.finditer(data):
+            if m.start() != pos:
+                self._illegal(data, pos, m.start())
+            index = m.lastindex
+            start, end = m.span(index)
+            if start != pos:
+                lineno += data[pos:start].count(b'\n')
+            pos = end
+            kind = kinds[index]
+            if kind is DISCARD:
+                continue
+            if kind is ID:
+                kind = keyword_map.get(data[start:end], 'ID')
+            yield ByteToken(kind, lineno, start, end, data)
+        if pos != len(data):
+            self._illegal(data, pos, len(data))
+        self.lineno = lineno + data[pos:].count(b'\n')
+        self.lexpos = len(data)
+
+
+class TokenBuffer(object):
+    """ The tokens of a source packed in arrays: the kind of each token as
+        its index in UCLexer.tokens, its offset and its line. Tokens whose
+        lexeme is always the same (operators, punctuation and keywords) keep
+        their value once per kind; the lexemes of IDs and constants are
+        sliced from the source again, only when a token is replayed.
+
+        Lexical errors are reported while the buffer is built. Iterating
+        over the buffer yields tokens that the parser can consume, see
+        UCParser.parse_tokens().
+    """
+    variable = ('ID', 'INT_CONST', 'FLOAT_CONST', 'CHAR_CONST', 'STRING')
+
+    def __init__(self, lexer, text):
+        self.text = text
+        self.module = type(lexer)
+        self.names = lexer.tokens
+        self.kinds = array('B')
+        self.offsets = array('I')
+        self.lines = array('I')
+        self.values = {}
+
+        index = {name: kind for kind, name in enumerate(self.names)}
+        variable = set(index[name] for name in self.variable)
+        values = self.values
+        lexer.reset(text)
+        token = lexer.lexer.token
+        for tok in iter(token, None):
+            kind = index[tok.type]
+            self.kinds.append(kind)
+            self.offsets.append(tok.lexpos)
+            self.lines.append(tok.lineno)
+            if kind not in variable and kind not in values:
+                values[kind] = tok.value
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_master', None)
+        return state
+
+    def __iter__(self):
+        text, names, values = self.text, self.names, self.values
+        master = getattr(self, '_master', None) or self._compile()
+        decode = not isinstance(text, str)
+        for kind, offset, line in zip(self.kinds, self.offsets, self.lines):
+            value = values.get(kind)
+            if value is None:
+                m = master.match(text, offset)
+                value = text[offset:m.end(m.lastindex)]
+                if decode:
+                    value = value.decode('utf-8')
+            yield Token(names[kind], value, line, offset)
+
+    def _compile(self):
+        # The lexeme of a variable token is matched again by the Scanner's
+        # master pattern, whatever engine built the buffer.
+        master, master_bytes, _ = Scanner.patterns(self.module)
+        self._master = master if isinstance(self.text, str) else master_bytes
+        return self._master
@@ -1,12 +1,221 @@
-from uc_ast2 import *
-from uc_lexer import UCLexer
+import io
+import os
+import re
+import copy
+import mmap
+import ply
 import ply.yacc as yacc
+from functools import partial
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+import uc_lexer
+from uc_ast2 import *
+from uc_lexer import UCLexer, utf8_pattern
+from uc_cache import cache_dir, source_hash, load_module, prune, gc_paused
+
+# The lexer and LALR tables are generated once and cached on disk. They are
+# versioned by a hash of both grammar files (and of the PLY version), so any
+# edit to uc_parser.py or uc_lexer.py invalidates them automatically.
+_tables_hash = source_hash(__file__, uc_lexer.__file__, extra=ply.__version__)
+_lextab = 'uc_lextab_' + _tables_hash
+_parsetab = 'uc_parsetab_' + _tables_hash
+_tables = {_lextab: load_module(_lextab), _parsetab: load_module(_parsetab)}
+
+
+def _table(name):
+    """ Returns the cached table module 'name', or just its name when the
+        table still has to be generated (PLY then writes it to the cache).
+    """
+    if _tables.get(name) is None:
+        _tables[name] = load_module(name)
+        if _tables[name] is None:
+            prune(name[:-len(_tables_hash)], name)
+            return name
+    return _tables[name]
+
+# Things that can hide a top-level boundary (strings, char constants and
+# comments, matched like the lexer does) and the characters that make one.
+_toplevel = re.compile(r'"[^"]*"|\'.\'|/\*(?:.|\n)*?\*/|//.*|[{};)]')
+_toplevel_bytes = utf8_pattern(_toplevel.pattern)
+
+
+def split_toplevel(code):
+    """ Returns where the top-level declarations and function definitions
+        of code end, after a ';' or after the '}' closing a function body,
+        outside strings and comments: a list of (offset, line), line being
+        the line number the lexer gives to that offset (it does not count
+        the newlines inside comments and strings). Returns None if the
+        braces do not balance. code may also be UTF-8 bytes or a mmap.
+    """
+    text = isinstance(code, str)
+    toplevel, newline = (_toplevel, '\n') if text else (_toplevel_bytes, b'\n')
+    ends = []
+    depth = 0
+    body = False
+    after_paren = False
+    last = 0
+    line = 1
+    for m in toplevel.finditer(code):
+        c = m.group()
+        if len(c) > 1:
+            line -= c.count(newline)
+            if c[:1] in ('/', b'/'):
+                continue
+        elif not text:
+            c = c.decode('ascii')
+        if c == '{':
+            if depth == 0:
+                body = after_paren
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0 and body:
+                line += _count_newlines(code, last, m.end())
+                last = m.end()
+                ends.append((last, line))
+        elif c == ';' and depth == 0:
+            line += _count_newlines(code, last, m.end())
+            last = m.end()
+            ends.append((last, line))
+        after_paren = c == ')'
+    return ends if depth == 0 else None
+
+
+def _count_newlines(code, start, end):
+    """ Returns the number of newlines in code[start:end]. """
+    if isinstance(code, str):
+        return code.count('\n', start, end)
+    return code[start:end].count(b'\n')
+
+
+def _toplevel_spans(code):
+    """ Returns the top-level items of code as (start, end, line) tuples,
+        line being the lexer's line number at start; the text after the
+        last item goes with it. Returns None if there are no items.
+    """
+    ends = split_toplevel(code)
+    if not ends:
+        return None
+    starts = [(0, 1)] + ends[:-1]
+    ends[-1] = (len(code), None)
+    return [(start, end, line) for (start, line), (end, _) in zip(starts, ends)]
+
+
+def _column(code, offset):
+    """ Returns the column of offset in code, in characters. """
+    if isinstance(code, str):
+        return offset - code.rfind('\n', 0, offset)
+    line = code[code.rfind(b'\n', 0, offset) + 1:offset]
+    return len(line if line.isascii() else line.decode('utf-8', 'replace')) + 1
+
+
+def _shift_lines(node, shift, seen):
+    """ Moves the coordinates of node and of all nodes below it 'shift'
+        lines down, including the nodes held in slots that are not
+        children (the declname IDs). Nodes shared by several parents are
+        moved once.
+    """
+    def shift_node(node, name, depth):
+        if id(node) in seen:
+            return False
+        seen.add(id(node))
+        coord = node.coord
+        if coord and coord.line:
+            node.coord = coord.shifted(shift)
+        for slot in _other_slots(node.__class__):
+            value = getattr(node, slot)
+            if isinstance(value, Node):
+                walk(value, shift_node)
+            elif value.__class__ is list:
+                for item in value:
+                    if isinstance(item, Node):
+                        walk(item, shift_node)
+    walk(node, shift_node)
+
+
+_other_slots_of = {}
+
+
+def _other_slots(cls):
+    """ Returns the slots of the node class cls, other than its coord,
+        that are not children. """
+    slots = _other_slots_of.get(cls)
+    if slots is None:
+        slots = _other_slots_of[cls] = tuple(slot for slot in cls.__slots__
+                                             if slot != 'coord' and slot not in cls.child_slots)
+    return slots
 
 
 class UCParser:
-    def __init__(self):
+    """ A long-lived uC parser. The lexer and the LR parser are built once,
+        from the cached tables, and every call to parse() only resets the
+        per-input state, so one instance can parse any number of sources.
+    """
+    tokens = UCLexer.tokens
+    precedence = (
+        ('left', 'OR'),
+        ('left', 'AND'),
+        # ('left', 'ADDRESS'),
+        ('left', 'EQ', 'NQ'),
+        ('left', 'LT', 'GT', 'LE', 'GE'),
+        ('left', 'PLUS', 'MINUS'),
+        ('left', 'TIMES', 'DIVIDE', 'MOD'),
+        ('right', 'UMINUS')
+    )
+
+    def __init__(self, engine='ply'):
         self.errors = 0
         self.warnings = 0
+        self.debug = False
+        self.filename = ''
+        self.engine = engine
+        self._build()
+
+    def _build(self):
+        self.lexer = UCLexer(self.print_error)
+        self.lexer.build(engine=self.engine, optimize=True, lextab=_table(_lextab), outputdir=cache_dir())
+        self.parser = yacc.yacc(module=self, optimize=True, tabmodule=_table(_parsetab),
+                                outputdir=cache_dir(), debug=False)
+        self._productions = self.parser.productions
+        self._traced_productions = None
+
+    def clone(self):
+        """ Returns an independent parser that shares the (read-only) LR
+            tables of this one. Only the lexer state and the productions,
+            which hold bound grammar actions, are copied.
+        """
+        other = copy.copy(self)
+        other.errors = 0
+        other.warnings = 0
+        other.lexer = self.lexer.clone(other.print_error)
+        other.parser = copy.copy(self.parser)
+        other.parser.errorfunc = other.p_error
+        other._productions = []
+        for prod in self._productions:
+            prod = copy.copy(prod)
+            if prod.func:
+                prod.callable = getattr(other, prod.func)
+            other._productions.append(prod)
+        other._traced_productions = None
+        other.parser.productions = other._productions
+        for name in self._traced_helpers:
+            other.__dict__.pop(name, None)
+        return other
+
+    def __getstate__(self):
+        # The lexer and the LR parser hold bound methods and compiled regexes;
+        # a pickled parser rebuilds them from the cached tables instead.
+        state = self.__dict__.copy()
+        del state['lexer'], state['parser'], state['_productions'], state['_traced_productions']
+        for name in self._traced_helpers:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
 
     def print_error(self, msg, x, y):
         print("Lexical error: %s at %d:%d" % (msg, x, y))
@@ -14,20 +223,106 @@ class UCParser:
     def show(self, buf=None, showcoord=True):
         print("I'm on show")
 
+    # Traced reductions print the name of their production, except for the
+    # actions below, which print their own name. The empty production is
+    # not traced.
+    _traced_by_action = {
+        'p_function_definition_1', 'p_function_definition_2',
+        'p_init_declarator_list_1', 'p_init_declarator_list_2',
+        'p_parameter_list_1', 'p_parameter_list_2',
+        'p_expression_1', 'p_expression_2',
+        'p_direct_declarator_1', 'p_direct_declarator_2', 'p_direct_declarator_3',
+        'p_direct_declarator_4', 'p_direct_declarator_5',
+    }
+
+    def _traced(self, action, name):
+        """ Wraps a grammar action so that its reduction is printed. """
+        def traced_action(p):
+            print("Inside {0}:".format(name))
+            for i in range(len(p)):
+                print("p[{0}] = {1}".format(i, p[i]))
+            print()
+            action(p)
+            print("p[0] = {0}".format(p[0]))
+            print('End')
+        return traced_action
+
+    # The helpers the actions build declarations with. In debug mode they
+    # are shadowed on the instance by their _traced_ versions below, which
+    # print what they get and call them.
+    _traced_helpers = ('_type_modify_decl', '_build_function_definition', '_build_declarations',
+                       '_fix_decl_name_type')
+
+    def _traced_type_modify_decl(self, decl, modifier):
+        print("Inside _type_modify_decl:")
+        print(decl)
+        print('End')
+        return UCParser._type_modify_decl(self, decl, modifier)
+
+    def _traced_build_function_definition(self, spec, decl, param_decls, body):
+        print("Inside _build_function_definition:")
+        print(spec)
+        print(decl)
+        print(param_decls)
+        print(body)
+        print('End')
+        return UCParser._build_function_definition(self, spec, decl, param_decls, body)
+
+    def _traced_build_declarations(self, spec, decls):
+        print("Inside _build_declarations:")
+        for decl in decls:
+            print(decl)
+        print(spec)
+        print('End')
+        declarations = []
+        for decl in decls:
+            print(decl)
+            declarations.extend(UCParser._build_declarations(self, spec, [decl]))
+        return declarations
+
+    def _traced_fix_decl_name_type(self, decl, typename):
+        print("Inside _fix_decl_name_type:")
+        print(decl)
+        print("typename")
+        print(typename)
+        print('End')
+        type = decl
+        while not isinstance(type, VarDecl):
+            print("no while")
+            print(type)
+            type = type.type
+        UCParser._fix_decl_name_type(self, decl, typename)
+        print("after while")
+        print(decl)
+        print('End')
+        return decl
+
+    def _select_actions(self, debug):
+        """ The p_* actions and the helpers they call carry no debug code,
+            since reductions are the parser's hot loop. In debug mode the
+            parser runs traced copies of them instead, built on first use.
+        """
+        if not debug:
+            self.parser.productions = self._productions
+            for name in self._traced_helpers:
+                self.__dict__.pop(name, None)
+            return
+        for name in self._traced_helpers:
+            setattr(self, name, getattr(self, '_traced' + name))
+        if self._traced_productions is None:
+            self._traced_productions = []
+            for prod in self._productions:
+                prod = copy.copy(prod)
+                if prod.callable and prod.func != 'p_empty':
+                    name = prod.func if prod.func in self._traced_by_action else 'p_' + prod.name
+                    prod.callable = self._traced(prod.callable, name)
+                self._traced_productions.append(prod)
+        self.parser.productions = self._traced_productions
+
     def _token_coord(self, p, token_idx):
-        last_cr = p.lexer.lexdata.rfind('\n', 0, p.lexpos(token_idx))
-        if last_cr < 0:
-            last_cr = -1
-        column = (p.lexpos(token_idx) - (last_cr))
-        return Coord(p.lineno(token_idx), column).__str__()
+        return Coord(p.lineno(token_idx), self.lexer.find_column(p.lexpos(token_idx)))
 
     def _type_modify_decl(self, decl, modifier):
-        if self.debug:
-        # if False:
-            print("Inside _type_modify_decl:")
-            print(decl)
-            print('End')
-
         modifier_head = modifier
         modifier_tail = modifier
 
@@ -54,33 +349,14 @@ class UCParser:
             print("Error at the end of input")
 
     def _build_function_definition(self, spec, decl, param_decls, body):
-        if self.debug:
-        # if False:
-            print("Inside _build_function_definition:")
-            print(spec)
-            print(decl)
-            print(param_decls)
-            print(body)
-            print('End')
-
         declaration = self._build_declarations(spec=spec, decls=[dict(decl=decl, init=None)])[0]
 
         return FuncDef(spec=spec, decl=declaration, param_decls=param_decls, body=body, coord=decl.coord)
 
     def _build_declarations(self, spec, decls):
-        if self.debug:
-        # if False:
-            print("Inside _build_declarations:")
-            for decl in decls:
-                print(decl)
-            print(spec)
-            print('End')
-
         declarations = []
 
         for decl in decls:
-            if self.debug:
-                print(decl)
             assert decl['decl'] is not None
             declaration = Decl(name=None, type=decl['decl'], init=decl.get('init'), coord=decl.get('coord'))
 
@@ -94,693 +370,273 @@ class UCParser:
         return declarations
 
     def _fix_decl_name_type(self, decl, typename):
-        if self.debug:
-        # if False:
-            print("Inside _fix_decl_name_type:")
-            print(decl)
-            print("typename")
-            print(typename)
-            print('End')
-
         type = decl
         while not isinstance(type, VarDecl):
-            if self.debug:
-                print("no while")
-                print(type)
-
             type = type.type
 
         decl.name = type.declname
         type.type = typename
 
-        if self.debug:
-        # if False:
-            print("after while")
-            print(decl)
-            print('End')
-
         return decl
 
     def p_program(self, p):
         ''' program : global_declaration_list
         '''
-        if self.debug:
-            print("Inside p_program:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Program(p[1])
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_global_declaration_list(self, p):
         ''' global_declaration_list : global_declaration
                                     | global_declaration_list global_declaration
         '''
-        if self.debug:
-            print("Inside p_global_declaration_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = [p[1]]
         else:
-            p[0] = p[1]+[p[2]]
-
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_global_declaration_1(self, p):
         ''' global_declaration : function_definition
         '''
-        if self.debug:
-            print("Inside p_global_declaration:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_global_declaration_2(self, p):
         ''' global_declaration : declaration
         '''
-        if self.debug:
-            print("Inside p_global_declaration:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = GlobalDecl(p[1])
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_block_item_list_opt(self, p):
         ''' block_item_list_opt : block_item_list
                                 | empty
         '''
-        if self.debug:
-            print("Inside p_block_item_list_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_block_item_list(self, p):
         ''' block_item_list : block_item
                             | block_item_list block_item
         '''
-        if self.debug:
-            print("Inside p_block_item_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
-        if len(p) == 2 or p[2] == [None]:
-            p[0] = p[1]
-        else:
-            p[0] = p[1] + p[2]
-
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
+        if len(p) == 3 and p[2] != [None]:
+            p[1].extend(p[2])
+        p[0] = p[1]
 
     def p_block_item(self, p):
         ''' block_item : statement
                        | declaration
         '''
-        if self.debug:
-            print("Inside p_block_item:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if isinstance(p[1], list):
             p[0] = p[1]
         else:
             p[0] = [p[1]]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_function_definition_1(self, p):
         ''' function_definition : type_specifier declarator declaration_list_opt compound_statement
         '''
-        if self.debug:
-        # if True:
-            print("Inside p_function_definition_1:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = self._build_function_definition(spec=p[1], decl=p[2], param_decls=p[3], body=p[4])
 
-        if self.debug:
-        # if True:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_function_definition_2(self, p):
         ''' function_definition : declarator declaration_list_opt compound_statement
         '''
-        if self.debug:
-        # if True:
-            print("Inside p_function_definition_2:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = self._build_function_definition(spec=dict(type=[Type(['void'], coord=self._token_coord(p, 1))], function=[]),
                                                decl=p[1], param_decls=p[2], body=p[3])
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_init_declarator_list_opt(self, p):
         ''' init_declarator_list_opt : init_declarator_list
                                      | empty
         '''
-        if self.debug:
-            print("Inside p_init_declarator_list_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_init_declarator_list_1(self, p):
         ''' init_declarator_list : init_declarator
         '''
-        if self.debug:
-            print("Inside p_init_declarator_list_1:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = [p[1]]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_init_declarator_list_2(self, p):
         ''' init_declarator_list : init_declarator_list COMMA init_declarator
         '''
-        if self.debug:
-            print("Inside p_init_declarator_list_2:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
-        p[0] = p[1] + [p[3]]
-
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
+        p[1].append(p[3])
+        p[0] = p[1]
 
     def p_init_declarator(self, p):
         ''' init_declarator : declarator
                             | declarator EQUALS initializer
         '''
-        if self.debug:
-            print("Inside p_init_declarator:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = dict(decl=p[1], init=None)
         else:
             p[0] = dict(decl=p[1], init=p[3])
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
-
     def p_initializer_1(self, p):
         ''' initializer : assignment_expression
         '''
-        if self.debug:
-            print("Inside p_initializer:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_initializer_2(self, p):
         ''' initializer : LBRACE initializer_list RBRACE
                         | LBRACE initializer_list COMMA RBRACE
         '''
-        if self.debug:
-            print("Inside p_initializer:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if p[2] is None:
             p[0] = InitList([], self._token_coord(p, 1))
         else:
             p[0] = p[2]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_initializer_list_1(self, p):
         ''' initializer_list : initializer
         '''
-        if self.debug:
-            print("Inside p_initializer_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = InitList([p[1]], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_initializer_list_2(self, p):
         ''' initializer_list : initializer_list COMMA initializer
         '''
-        if self.debug:
-            print("Inside p_initializer_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[1].exprs.append(p[3])
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_declaration(self, p):
         ''' declaration :  decl_body SEMI
         '''
-        if self.debug:
-            print("Inside p_declaration:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_decl_body(self, p):
         ''' decl_body : type_specifier init_declarator_list_opt
         '''
-        if self.debug:
-            print("Inside p_decl_body:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         spec = p[1]
         if p[2] is not None:
             decls = self._build_declarations(spec=spec, decls=p[2])
         p[0] = decls
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_declaration_list_opt(self, p):
         ''' declaration_list_opt : declaration_list
                                  | empty
         '''
-        if self.debug:
-            print("Inside p_declaration_list_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_declaration_list(self, p):
         ''' declaration_list : declaration
                             | declaration_list declaration
         '''
-        if self.debug:
-            print("Inside p_declaration_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = DeclList(p[1])
         else:
-            p[0] = p[1]+[p[2]]
-
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
+            p[1].decls.extend(p[2])
+            p[0] = p[1]
 
     def p_declarator(self, p):
         ''' declarator : pointer direct_declarator
                        | direct_declarator
         '''
-        if self.debug:
-            print("Inside p_declarator:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = p[1]
         else:
             p[0] = self._type_modify_decl(decl=p[2], modifier=p[1])
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_parameter_list_1(self, p):
         ''' parameter_list : parameter_declaration
         '''
-        if self.debug:
-            print("Inside p_parameter_list_1:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = ParamList([p[1]], coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_parameter_list_2(self, p):
         ''' parameter_list : parameter_list COMMA parameter_declaration
         '''
-        if self.debug:
-            print("Inside p_parameter_list_2:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[1].params.append(p[3])
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_parameter_declaration(self, p):
         ''' parameter_declaration : type_specifier declarator
         '''
-        if self.debug:
-            print("Inside p_parameter_declaration:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         spec = p[1]
 
         p[0] = self._build_declarations(spec=spec, decls=[dict(decl=p[2])])[0]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_compound_statement(self, p):
         ''' compound_statement : LBRACE block_item_list_opt RBRACE
         '''
-        if self.debug:
-            print("Inside p_compound_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Compound(block_items=p[2], coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_expression_statement(self, p):
         ''' expression_statement : expression_opt SEMI
         '''
-        if self.debug:
-            print("Inside p_expression_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if p[1] is None:
             p[0] = EmptyStatement(self._token_coord(p, 2))
         else:
             p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_expression_opt(self, p):
         ''' expression_opt : expression
                            | empty
         '''
-        if self.debug:
-            print("Inside p_expression_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_expression_1(self, p):
         ''' expression : assignment_expression
         '''
-        if self.debug:
-            print("Inside p_expression_1:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_expression_2(self, p):
         ''' expression : expression COMMA assignment_expression
         '''
-        if self.debug:
-            print("Inside p_expression_2:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if not isinstance(p[1], ExprList):
             p[1] = ExprList([p[1]], p[1].coord)
 
         p[1].exprs.append(p[3])
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_selection_statement(self, p):
         ''' selection_statement : IF LPAREN expression RPAREN statement
                                 | IF LPAREN expression RPAREN statement ELSE statement
         '''
-        if self.debug:
-            print("Inside p_selection_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 6:
             p[0] = If(p[3], p[5], None, self._token_coord(p, 1))
         elif len(p) == 8:
             p[0] = If(p[3], p[5], p[7], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_iteration_statement_1(self, p):
         ''' iteration_statement : WHILE LPAREN expression RPAREN statement
         '''
-        if self.debug:
-            print("Inside p_iteration_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = While(p[3], p[5], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_iteration_statement_2(self, p):
         ''' iteration_statement : FOR LPAREN expression_opt SEMI expression_opt SEMI expression_opt RPAREN statement
         '''
-        if self.debug:
-            print("Inside p_iteration_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = For(p[3], p[5], p[7], p[9], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_iteration_statement_3(self, p):
         ''' iteration_statement : FOR LPAREN declaration expression_opt SEMI expression_opt RPAREN statement
         '''
-        if self.debug:
-            print("Inside p_iteration_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = For(DeclList(p[3], self._token_coord(p, 1)), p[4], p[6], p[8], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_jump_statement_1(self, p):
         ''' jump_statement : BREAK SEMI
         '''
-        if self.debug:
-            print("Inside p_jump_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Break(self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_jump_statement_2(self, p):
         ''' jump_statement : RETURN expression SEMI
         '''
-        if self.debug:
-            print("Inside p_jump_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Return(p[2], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_jump_statement_3(self, p):
         ''' jump_statement : RETURN SEMI
         '''
-        if self.debug:
-            print("Inside p_jump_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Return(None, self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_assert_statement(self, p):
         ''' assert_statement : ASSERT expression SEMI
         '''
-        if self.debug:
-            print("Inside p_assert_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Assert(p[2], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_print_statement(self, p):
         ''' print_statement : PRINT LPAREN expression_opt RPAREN SEMI
         '''
-        if self.debug:
-            print("Inside p_print_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         exprs = None
         if len(p) == 6:
             exprs = [p[3]]
         p[0] = Print(exprs, self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_read_statement(self, p):
         ''' read_statement : READ LPAREN argument_expression_list RPAREN SEMI
         '''
-        if self.debug:
-            print("Inside p_read_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Read([p[3]], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_statement(self, p):
         ''' statement : expression_statement
                       | compound_statement
@@ -791,63 +647,23 @@ class UCParser:
                       | print_statement
                       | read_statement
         '''
-        if self.debug:
-            print("Inside p_statement:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_assignment_expression_1(self, p):
         ''' assignment_expression : binary_expression
         '''
-        if self.debug:
-            print("Inside p_assignment_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_assignment_expression_2(self, p):
         ''' assignment_expression : unary_expression assignment_operator assignment_expression
         '''
-        if self.debug:
-            print("Inside p_assignment_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Assignment(p[2], p[1], p[3], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_binary_expression_1(self, p):
         ''' binary_expression : cast_expression
         '''
-        if self.debug:
-            print("Inside p_binary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_binary_expression_2(self, p):
         ''' binary_expression : binary_expression TIMES binary_expression
                               | binary_expression DIVIDE binary_expression
@@ -863,215 +679,79 @@ class UCParser:
                               | binary_expression AND binary_expression
                               | binary_expression OR binary_expression
         '''
-        if self.debug:
-            print("Inside p_binary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = BinaryOp(p[2], p[1], p[3], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_unary_expression_1(self, p):
         ''' unary_expression : postfix_expression
         '''
-        if self.debug:
-            print("Inside p_unary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_unary_expression_2(self, p):
         ''' unary_expression : INCREASE unary_expression
                              | DECREASE unary_expression
                              | unary_operator cast_expression
         '''
-        if self.debug:
-            print("Inside p_unary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = UnaryOp(p[1], p[2], p[2].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_postfix_expression_1(self, p):
         ''' postfix_expression : primary_expression
         '''
-        if self.debug:
-            print("Inside p_postfix_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_postfix_expression_2(self, p):
         ''' postfix_expression : postfix_expression INCREASE
                                | postfix_expression DECREASE
         '''
-        if self.debug:
-            print("Inside p_postfix_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = UnaryOp('p' + p[2], p[1], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_postfix_expression_3(self, p):
         ''' postfix_expression : postfix_expression LBRACKET expression RBRACKET
         '''
-        if self.debug:
-            print("Inside p_postfix_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = ArrayRef(p[1], p[3], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_postfix_expression_4(self, p):
         ''' postfix_expression : postfix_expression LPAREN argument_expression_opt RPAREN
         '''
-        if self.debug:
-            print("Inside p_postfix_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = FuncCall(p[1], p[3], p[1].coord)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_cast_expression_1(self, p):
         ''' cast_expression : unary_expression
         '''
-        if self.debug:
-            print("Inside p_cast_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_cast_expression_2(self, p):
         ''' cast_expression : LPAREN type_specifier RPAREN cast_expression
         '''
-        if self.debug:
-            print("Inside p_cast_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Cast(p[2], p[4], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_string_literal(self, p):
         ''' string_literal : STRING
         '''
-        if self.debug:
-            print("Inside p_string_literal:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Constant('string', p[1], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_primary_expression_1(self, p):
         ''' primary_expression : identifier
                                | constant
                                | string_literal
         '''
-        if self.debug:
-            print("Inside p_primary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_primary_expression_2(self, p):
         ''' primary_expression : LPAREN expression RPAREN
         '''
-        if self.debug:
-            print("Inside p_primary_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[2]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_argument_expression_opt(self, p):
         ''' argument_expression_opt : argument_expression_list
                                     | empty
         '''
-        if self.debug:
-            print("Inside p_argument_expression_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if p[1] is not None:
             p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_argument_expression_list(self, p):
         ''' argument_expression_list : assignment_expression
                                      | argument_expression_list COMMA assignment_expression
         '''
-        if self.debug:
-            print("Inside p_argument_expression_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = p[1]
         else:
@@ -1081,41 +761,17 @@ class UCParser:
             p[1].exprs.append(p[3])
             p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_constant_expression_opt(self, p):
         ''' constant_expression_opt : constant_expression
                                     | empty
         '''
-        if self.debug:
-            print("Inside p_constant_expression_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_constant_expression(self, p):
         ''' constant_expression : binary_expression
         '''
-        if self.debug:
-            print("Inside p_constant_expression:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_assignment_operator(self, p):
         ''' assignment_operator : EQUALS
                                | EQTIMES
@@ -1124,18 +780,8 @@ class UCParser:
                                | EQPLUS
                                | EQMINUS
         '''
-        if self.debug:
-            print("Inside p_assignment_operator:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_unary_operator(self, p):
         ''' unary_operator : ADDRESS
                            | TIMES
@@ -1143,243 +789,95 @@ class UCParser:
                            | UMINUS
                            | NOT
         '''
-        if self.debug:
-            print("Inside p_unary_operator:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_constant_1(self, p):
         ''' constant : INT_CONST
         '''
-        if self.debug:
-            print("Inside p_constant:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Constant('int', p[1], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_constant_2(self, p):
         ''' constant : FLOAT_CONST
         '''
-        if self.debug:
-            print("Inside p_constant:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Constant('float', p[1], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_constant_3(self, p):
         ''' constant : CHAR_CONST
         '''
-        if self.debug:
-            print("Inside p_constant:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Constant('char', p[1], self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_pointer_1(self, p):
         ''' pointer : TIMES pointer
         '''
-        if self.debug:
-            print("Inside p_pointer:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         tail_type = p[3]
         while tail_type.type is not None:
             tail_type = tail_type.type
         tail_type.type = PtrDecl(type=None, coord=self._token_coord(p, 1))
         p[0] = p[2]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_pointer_2(self, p):
         ''' pointer : TIMES
         '''
-        if self.debug:
-            print("Inside p_pointer:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = PtrDecl(type=None, coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_direct_declarator_1(self, p):
         ''' direct_declarator : identifier
         '''
-        if self.debug:
-            print("Inside p_direct_declarator_1:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = VarDecl(p[1], type=None, coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_direct_declarator_2(self, p):
         ''' direct_declarator : LPAREN declarator RPAREN
         '''
-        if self.debug:
-            print("Inside p_direct_declarator_2:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = p[2]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_direct_declarator_3(self, p):
         ''' direct_declarator : direct_declarator LPAREN parameter_list RPAREN
         '''
-        if self.debug:
-            print("Inside p_direct_declarator_3:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         func = FuncDecl(args=p[3], type=None, coord=p[1].coord)
 
         p[0] = self._type_modify_decl(decl=p[1], modifier=func)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_direct_declarator_4(self, p):
         ''' direct_declarator : direct_declarator LBRACKET constant_expression_opt RBRACKET
         '''
-        if self.debug:
-            print("Inside p_direct_declarator_4:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         arr = ArrayDecl(type=None, dim=p[3], coord=p[1].coord)
         p[0] = self._type_modify_decl(decl=p[1], modifier=arr)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_direct_declarator_5(self, p):
         ''' direct_declarator : direct_declarator LPAREN id_list_opt RPAREN
         '''
-        if self.debug:
-            print("Inside p_direct_declarator_5:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         func = FuncDecl(args=p[3], type=None, coord=p[1].coord)
         p[0] = self._type_modify_decl(decl=p[1], modifier=func)
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_id_list_opt(self, p):
         ''' id_list_opt : id_list
                         | empty
         '''
-        if self.debug:
-            print("Inside p_id_list_opt:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
         p[0] = p[1]
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_id_list(self, p):
         ''' id_list : identifier
                     | id_list identifier
         '''
-        if self.debug:
-            print("Inside p_id_list:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         if len(p) == 2:
             p[0] = [p[1]]
         else:
-            p[0] = p[1] + [p[2]]
-
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_identifier(self, p):
         ''' identifier : ID
         '''
-        if self.debug:
-            print("Inside p_identifier:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = ID(p[1], coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_type_specifier(self, p):
         ''' type_specifier : VOID
                            | INT
                            | FLOAT
                            | CHAR
         '''
-        if self.debug:
-            print("Inside p_type_specifier:")
-            for i in range(len(p)):
-                print("p[{0}] = {1}".format(i, p[i]))
-            print()
-
         p[0] = Type([p[1]], coord=self._token_coord(p, 1))
 
-        if self.debug:
-            print("p[0] = {0}".format(p[0]))
-            print('End')
-
     def p_empty(self, p):
         ''' empty :'''
         # print("Inside p_empty:")
@@ -1390,27 +888,217 @@ class UCParser:
 
     def parse(self, code, filename='', debug=0):
         self.debug = debug
+        self.filename = filename
+        self.errors = 0
 
         if debug:
             print("Code: {0}".format(code))
             print("Filename: {0}".format(filename))
 
-        self.lexer = UCLexer(self.print_error)
-        self.lexer.build()
-
-        self.tokens = self.lexer.tokens
-        self.precedence = (
-             ('left', 'OR'),
-             ('left', 'AND'),
-             # ('left', 'ADDRESS'),
-             ('left', 'EQ', 'NQ'),
-             ('left', 'LT', 'GT', 'LE', 'GE'),
-             ('left', 'PLUS', 'MINUS'),
-             ('left', 'TIMES', 'DIVIDE', 'MOD'),
-             ('right', 'UMINUS')
-         )
-
-        parser = yacc.yacc(module=self, write_tables=False)
-        result = parser.parse(code, tracking=False)
-
-        return result
+        self.lexer.filename = filename
+        self.lexer.reset(code)
+        self._select_actions(debug)
+
+        return self.parser.parse(None, lexer=self.lexer.lexer, tokenfunc=self.lexer.token, tracking=False)
+
+    def parse_tokens(self, tokens, filename='', debug=0):
+        """ Parses the tokens of a TokenBuffer (see UCLexer.tokenize()),
+            without lexing its source again.
+        """
+        self.debug = debug
+        self.filename = filename
+        self.errors = 0
+
+        self.lexer.filename = filename
+        self.lexer.start_lines(tokens.text)
+        self._select_actions(debug)
+
+        return self.parser.parse(None, lexer=self.lexer.lexer, tokenfunc=partial(next, iter(tokens), None),
+                                 tracking=False)
+
+    def parse_file(self, filename, debug=0):
+        """ Parses the file 'filename'. With the 'scanner' engine the file is
+            lexed straight from a read-only memory map of its bytes, so it is
+            never read into a string and tokens are produced as it is paged
+            in.
+        """
+        if self.engine != 'scanner':
+            with open(filename, 'r') as source:
+                return self.parse(source.read(), filename, debug)
+        with open(filename, 'rb') as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                return self.parse(b'', filename, debug)
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                try:
+                    return self.parse(data, filename, debug)
+                finally:
+                    self.lexer.reset(b'')
+
+    def parse_parallel(self, code, filename='', debug=0, workers=None):
+        """ Parses code in a pool of 'workers' processes. The source is split
+            at top-level boundaries (see split_toplevel()) into one run of
+            declarations per task, each run is parsed from its own line and
+            column, and the declarations are joined into one Program.
+
+            Whatever a task prints (lexical and syntax errors) is collected;
+            if any task printed or failed, the whole code is parsed again
+            serially, so the result and the messages are always those of
+            parse().
+        """
+        spans = _toplevel_spans(code)
+        workers = workers or os.cpu_count() or 1
+        if debug or workers < 2 or not spans or len(spans) < 2:
+            return self.parse(code, filename, debug)
+
+        tasks = []
+        count = min(len(spans), 4 * workers)
+        first = 0
+        for i in range(count):
+            last = (i + 1) * len(spans) // count - 1
+            start, _, line = spans[first]
+            end = spans[last][1]
+            tasks.append((code[start:end], line, _column(code, start)))
+            first = last + 1
+
+        # The returned trees hold no cycles; collecting while they are
+        # unpickled would only rescan them over and over.
+        with gc_paused(), ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(self.engine,)) as pool:
+            results = list(pool.map(_parse_run, tasks))
+        if any(ast is None or output for ast, output in results):
+            return self.parse(code, filename, debug)
+
+        self.debug = debug
+        self.filename = filename
+        self.errors = 0
+        return Program([decl for ast, _ in results for decl in ast.gdecls])
+
+    def parse_items(self, code, filename='', debug=0):
+        """ Parses code one top-level item at a time (see split_toplevel())
+            and yields the declarations of each item as soon as it is
+            parsed, so the caller can process and drop them before the rest
+            of code is parsed. The declarations are those that parse()
+            returns in Program.gdecls.
+
+            If code cannot be split, or an item prints anything (lexical and
+            syntax errors), None is yielded and the generator stops: code
+            must then be parsed as a whole, for its result and its messages.
+
+            With the 'scanner' engine, code may also be UTF-8 bytes or a
+            mmap of a source file; only the item being parsed is copied out.
+        """
+        spans = _toplevel_spans(code)
+        if debug or spans is None:
+            yield None
+            return
+        self.debug = debug
+        self.filename = filename
+        self.lexer.filename = filename
+        for start, end, line in spans:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                ast = self._parse_at(code[start:end], line, _column(code, start))
+            if ast is None or output.getvalue():
+                yield None
+                return
+            yield from ast.gdecls
+
+    def reparse(self, program, old_code, new_code, filename=''):
+        """ Parses new_code, an edit of old_code, reusing the Program that
+            parse() returned for old_code. Top-level items whose text did
+            not change are kept: those before the edit as they are, those
+            after it with their line numbers shifted. Only the items in
+            between are parsed, from their own line and column.
+
+            The reused nodes are moved (and updated) into the new Program,
+            so the old one must not be used afterwards, nor may it have been
+            through semantic analysis. The old items between the kept ones,
+            and the kept item on each side of them, are parsed again and
+            must have the structural_hash() of the declarations of the old
+            Program they splice in at. When they do not, or the changed
+            items have errors, new_code is parsed as a whole and its
+            messages are printed as parse() does.
+        """
+        old_spans = _toplevel_spans(old_code)
+        new_spans = _toplevel_spans(new_code)
+        if program is None or old_spans is None or new_spans is None or len(old_spans) != len(program.gdecls):
+            return self.parse(new_code, filename)
+        old_items = [old_code[start:end] for start, end, _ in old_spans]
+        new_items = [new_code[start:end] for start, end, _ in new_spans]
+
+        # Items kept at the beginning and at the end; the first item kept at
+        # the end must not have moved within its line.
+        limit = min(len(old_items), len(new_items))
+        first = 0
+        while first < limit and old_items[first] == new_items[first]:
+            first += 1
+        last = 0
+        while last < limit - first and old_items[-1 - last] == new_items[-1 - last]:
+            last += 1
+        while last and _column(old_code, old_spans[-last][0]) != _column(new_code, new_spans[-last][0]):
+            last -= 1
+
+        self.debug = 0
+        self.filename = filename
+        if first or last:
+            low, high = max(first - 1, 0), min(len(old_spans) - last + 1, len(old_spans))
+            old = self._parse_span(old_code, old_spans, low, high)
+            if old is None or len(old) != high - low:
+                return self.parse(new_code, filename)
+            hashes = {}
+            for decl, old_decl in zip(old, program.gdecls[low:high]):
+                if structural_hash(decl, hashes) != structural_hash(old_decl, hashes):
+                    return self.parse(new_code, filename)
+
+        changed = []
+        if first < len(new_spans) - last:
+            changed = self._parse_span(new_code, new_spans, first, len(new_spans) - last)
+            if changed is None:
+                return self.parse(new_code, filename)
+
+        kept = program.gdecls[len(old_spans) - last:]
+        if kept:
+            shift = new_spans[-last][2] - old_spans[-last][2]
+            if shift:
+                seen = set()
+                for decl in kept:
+                    _shift_lines(decl, shift, seen)
+        return Program(program.gdecls[:first] + changed + kept)
+
+    def _parse_span(self, code, spans, first, last):
+        """ Parses the items first to last - 1 of code, split into spans by
+            _toplevel_spans(). Returns their declarations, or None if they
+            have errors.
+        """
+        start, _, line = spans[first]
+        end = spans[last - 1][1]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            ast = self._parse_at(code[start:end], line, _column(code, start))
+        if ast is None or output.getvalue():
+            return None
+        return ast.gdecls
+
+    def _parse_at(self, code, line, column):
+        """ Parses code as if it started at line and column of a file. """
+        self.errors = 0
+        self.lexer.reset((' ' if isinstance(code, str) else b' ') * (column - 1) + code)
+        self.lexer.lexer.lineno = line
+        self._select_actions(0)
+        return self.parser.parse(None, lexer=self.lexer.lexer, tokenfunc=self.lexer.token, tracking=False)
+
+
+# The parser of a process of UCParser.parse_parallel()'s pool.
+_worker_parser = None
+
+
+def _start_worker(engine):
+    global _worker_parser
+    _worker_parser = UCParser(engine)
+
+
+def _parse_run(task):
+    output = io.StringIO()
+    with gc_paused(), redirect_stdout(output):
+        ast = _worker_parser._parse_at(*task)
+    return ast, output.getvalue()
+
@@ -1,3 +1,4 @@
+from types import GeneratorType
 from uc_ast2 import *
 
 
@@ -20,6 +21,10 @@ class UCType(object):
     def __str__(self):
         return str(self.typename)
 
+    def __reduce__(self):
+        # Types are singletons: pickle them by their global name (IntType...).
+        return self.typename.capitalize() + 'Type'
+
 
 IntType = UCType("int",
                  unary_ops={"-", "+", "--", "++", "p--", "p++", "*", "&"},
@@ -63,6 +68,150 @@ VoidType = UCType("void")
 
 PtrType = UCType("ptr")
 
+# The type of an expression whose check failed, when semantic analysis goes
+# on after errors: no operation accepts it.
+ErrorType = UCType("error")
+
+
+# The types of expressions are hash-consed: there is one shared Type, without
+# coord, for each list of names, so two expression types are the same type if
+# and only if they are the same object. Their names are a _Names, which cannot
+# be modified; build the names of a new type and intern those instead.
+# _types holds the types of the operator tables and the results below; each
+# Visitor interns the others in its own copy of it, so they go with it.
+class _Names(list):
+    """ The names of an interned Type: a list that raises on any change. """
+    __slots__ = ()
+
+    def _frozen(self, *args):
+        raise TypeError("the names of an interned Type cannot be changed")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+    append = extend = insert = pop = remove = clear = sort = reverse = _frozen
+
+    def __reduce__(self):
+        return _Names, (list(self),)
+
+
+_types = {}
+
+
+def intern_type(names, types=_types):
+    """ Returns the shared Type with the given names in the table types. """
+    key = tuple(names)
+    result = types.get(key)
+    if result is None:
+        result = types[key] = Type(_Names(key))
+    return result
+
+
+BoolResult = intern_type([BoolType])
+
+ErrorResult = intern_type([ErrorType])
+
+
+# uCIR opcode of each operator, completed by the name of the operand type.
+binary_opcodes = {"+": "add", "-": "sub", "*": "mul", "/": "div", "%": "mod",
+                  "==": "eq", "!=": "ne", "<": "lt", ">": "gt", "<=": "le", ">=": "ge", "&&": "and",
+                  "||": "or"}
+unary_opcodes = {"-": "sub", "+": "", "--": "sub", "++": "add", "p--": "sub", "p++": "add", "!": "not",
+                 "*": "", "&": ""}
+assign_opcodes = {"+=": "add", "-=": "sub", "*=": "mul", "/=": "div", "%=": "mod"}
+
+# The errors an Operation can stand for.
+TypeMismatch = 'mismatch'
+Unsupported = 'unsupported'
+
+
+class Operation(object):
+    """ What an operator does to operands of given types: the interned
+        Type of its result and the uCIR opcode that computes it or, when
+        the operator does not apply, the error code saying why.
+    """
+    __slots__ = ('error', 'type', 'opcode')
+
+    def __init__(self, error=None, type=None, opcode=None):
+        self.error = error
+        self.type = type
+        self.opcode = opcode
+
+
+_unsupported = Operation(Unsupported)
+
+
+def _operation_tables(uctypes):
+    """ Returns the BinaryTable, UnaryTable and AssignTable of uctypes. """
+    binary, unary, assign = {}, {}, {}
+    for ltype in uctypes:
+        for op in binary_opcodes:
+            for rtype in uctypes:
+                if ltype is not rtype:
+                    binary[op, ltype, rtype] = Operation(TypeMismatch)
+                elif op in ltype.binary_ops:
+                    binary[op, ltype, rtype] = Operation(None, intern_type((ltype,)),
+                                                         binary_opcodes[op] + '_' + ltype.typename)
+                elif op in ltype.rel_ops:
+                    binary[op, ltype, rtype] = Operation(None, BoolResult, binary_opcodes[op] + '_' + ltype.typename)
+                else:
+                    binary[op, ltype, rtype] = _unsupported
+        for op in unary_opcodes:
+            if op in ltype.unary_ops:
+                unary[op, ltype] = Operation(None, None, unary_opcodes[op] + '_' + ltype.typename)
+            else:
+                unary[op, ltype] = _unsupported
+        for op in ('=',) + tuple(assign_opcodes):
+            if op in ltype.assign_ops:
+                assign[op, ltype] = Operation(None, None, assign_opcodes.get(op, 'store') + '_' + ltype.typename)
+            else:
+                assign[op, ltype] = _unsupported
+    return binary, unary, assign
+
+
+# Operator tables of the uC types, looked up once per operator by semantic
+# analysis and code generation alike, through the *_operation() functions
+# below:
+#   - BinaryTable[op, ltype, rtype]: the UCTypes being the last names of the
+#     operand types, as both must be the same type
+#   - UnaryTable[op, uctype]: the result type is worked out by the caller, as
+#     '*' and '&' change the whole type
+#   - AssignTable[op, uctype]: for an lvalue and rvalue of one same type
+BinaryTable, UnaryTable, AssignTable = _operation_tables(
+    (IntType, FloatType, CharType, ArrayType, StringType, BoolType, VoidType, PtrType))
+
+
+def binary_operation(op, ltype, rtype):
+    return BinaryTable.get((op, ltype, rtype), _unsupported)
+
+
+def unary_operation(op, uctype):
+    return UnaryTable.get((op, uctype), _unsupported)
+
+
+def assign_operation(op, uctype):
+    return AssignTable.get((op, uctype), _unsupported)
+
+
+class SemanticError(AssertionError):
+    """ An error in the program being checked, found at coord. Its text is
+        only formatted when it is shown: message is a str.format() template
+        of args, where {coord} stands for coord. It is an AssertionError for
+        the callers that caught the asserts semantic analysis used to make.
+    """
+
+    def __init__(self, coord, message, *args):
+        super().__init__(coord, message, *args)
+
+    @property
+    def coord(self):
+        return self.args[0]
+
+    @property
+    def message(self):
+        return self.args[1]
+
+    def __str__(self):
+        return self.args[1].format(*self.args[2:], coord=self.args[0])
+
 
 class SymbolTable(dict):
     def __init__(self, decl=None):
@@ -77,30 +226,45 @@ class SymbolTable(dict):
 
 
 class Environment(object):
+    """ The scopes being checked, innermost last, one SymbolTable each.
+        Besides, symbols maps each name to the stack of its visible
+        bindings, innermost last, so lookup() is one dict probe however
+        deep the scopes are nested. A name is bound in the innermost scope
+        with bind(); pop() undoes the bindings of the scope it drops, the
+        names of that scope being its undo log.
+    """
     def __init__(self):
         self.loop_block = []
         self.rtypes = []
         self.loop_type = []
         self.stack = []
+        self.symbols = {}
         self.root = SymbolTable()
         self.stack.append(self.root)
-        self.root.update({
-            'int': IntType,
-            'float': FloatType,
-            'char': CharType,
-            'string': StringType,
-            'bool': BoolType,
-            'array': ArrayType,
-            'ptr': PtrType,
-            'void': VoidType
-        })
+        for name, uctype in (('int', IntType),
+                             ('float', FloatType),
+                             ('char', CharType),
+                             ('string', StringType),
+                             ('bool', BoolType),
+                             ('array', ArrayType),
+                             ('ptr', PtrType),
+                             ('void', VoidType)):
+            self.bind(name, uctype)
 
     def lookup(self, obj):
-        for scope in reversed(self.stack):
-            this = scope.lookup(obj)
-            if this is not None:
-                return this
-        return None
+        shadows = self.symbols.get(obj)
+        return shadows[-1] if shadows else None
+
+    def bind(self, name, value):
+        scope = self.stack[-1]
+        shadows = self.symbols.get(name)
+        if shadows is None:
+            self.symbols[name] = [value]
+        elif name in scope:
+            shadows[-1] = value
+        else:
+            shadows.append(value)
+        scope.add(name, value)
 
     def find(self, obj):
         cur_symtable = self.stack[-1]
@@ -113,7 +277,7 @@ class Environment(object):
         return len(self.stack)-1
 
     def set_local(self, obj, kind):
-        self.get().add(obj.name, obj)
+        self.bind(obj.name, obj)
         obj.kind = kind
         obj.scope = self.scope_level()
 
@@ -132,7 +296,12 @@ class Environment(object):
             self.loop_type = [VoidType]
 
     def pop(self):
-        self.stack.pop()
+        symbols = self.symbols
+        for name in self.stack.pop():
+            shadows = symbols[name]
+            shadows.pop()
+            if not shadows:
+                del symbols[name]
         self.loop_type = self.rtypes.pop()
 
 
@@ -168,13 +337,24 @@ class NodeVisitor(object):
                 NodeVisitor.generic_visit(self, node)
         *   Modeled after Python's own AST visiting facilities
             (the ast module of Python 3.0)
+
+        A visit_XXX method that needs the children visited first
+        yields them instead of calling visit() recursively:
+
+            def visit_BinaryOp(self, node):
+                left = yield node.left
+                right = yield node.right
+
+        visit() runs these generators on an explicit stack, so the
+        depth of the tree is not limited by the Python recursion
+        limit. Each yield gets back what the child visit returned,
+        and exceptions raised below propagate through the yield.
+        Methods that do not yield are called as plain functions.
     """
 
     _method_cache = None
 
-    def visit(self, node):
-        """ Visit a node.
-        """
+    def _dispatch(self, node):
         if self._method_cache is None:
             self._method_cache = {}
 
@@ -186,10 +366,59 @@ class NodeVisitor(object):
 
         return visitor(node)
 
+    def visit(self, node):
+        """ Visit a node.
+        """
+        result = self._dispatch(node)
+        if type(result) is not GeneratorType:
+            return result
+
+        stack = []
+        top = result
+        value = error = None
+        cache = self._method_cache
+        while True:
+            try:
+                if error is None:
+                    child = top.send(value)
+                else:
+                    error, thrown = None, error
+                    child = top.throw(thrown)
+            except StopIteration as stop:
+                if not stack:
+                    return stop.value
+                value = stop.value
+                top = stack.pop()
+                continue
+            except BaseException as e:
+                if not stack:
+                    raise
+                error = e
+                top = stack.pop()
+                continue
+            visitor = cache.get(child.__class__.__name__)
+            try:
+                value = visitor(child) if visitor is not None else self._dispatch(child)
+            except BaseException as e:
+                error = e
+                continue
+            if type(value) is GeneratorType:
+                stack.append(top)
+                top = value
+                value = None
+
     def generic_visit(self, node):
         for c in node:
             print("Generic_visit: {0}".format(c))
-            self.visit(c)
+            # Anything else, such as the characters of a string, would be
+            # visited again and again on the explicit stack.
+            if not isinstance(c, Node):
+                raise TypeError("Generic_visit: {0!r} is not a node".format(c))
+            yield c
+
+
+# The nodes of expressions, that have a type.
+_typed_nodes = (ArrayRef, BinaryOp, Cast, Constant, FuncCall, ID, UnaryOp)
 
 
 class Visitor(NodeVisitor):
@@ -198,7 +427,7 @@ class Visitor(NodeVisitor):
     of the form visit_NodeName() for each kind of AST node that you want to process.
     Note: You will need to adjust the names of the AST nodes if you picked different names.
     '''
-    def __init__(self, debug):
+    def __init__(self, debug, errors=None):
         # Initialize the symbol table
         self.environment = Environment()
         self.type_mapping = {
@@ -211,7 +440,77 @@ class Visitor(NodeVisitor):
             'void': VoidType,
             'ptr': PtrType
         }
+        # (rawtype, value) of each literal seen -> its (type, value)
+        self.constants = {}
+        # names -> interned Type, see intern_type()
+        self.types = dict(_types)
+        # The NodeIndex of the Program being checked, if one was built:
+        # the child slots sema rewrites go through it, see _set_child().
+        self.node_index = None
         self.debug = debug
+        # When errors is a function, each SemanticError is passed to it and
+        # checking goes on instead of stopping at the first one: the visit
+        # methods are wrapped to catch what they raise, see report().
+        self.errors = errors
+        if errors is not None:
+            self._method_cache = {name[6:]: self._guard(getattr(self, name))
+                                  for name in dir(self) if name.startswith('visit_')}
+
+    def report(self, node, error):
+        """ Reports the SemanticError error found at node. Without an
+            errors function it is raised. Otherwise node takes the error
+            type and error is passed on, unless there is already an error
+            at or below node: then it is a consequence of that one, as
+            "Cannot assign" is of an undefined operand, and it is dropped.
+        """
+        if self.errors is None:
+            raise error
+        if not self._erroneous(node):
+            self.errors(error)
+        if isinstance(node, _typed_nodes):
+            node.type = ErrorResult
+
+    def _set_child(self, parent, slot, node):
+        """ Puts node in the child slot of parent, keeping the NodeIndex of
+            the program up to date when it has one. """
+        if self.node_index is None:
+            setattr(parent, slot, node)
+        else:
+            self.node_index.replace(parent, slot, node)
+
+    def _erroneous(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if getattr(node, 'type', None) is ErrorResult:
+                return True
+            stack.extend(child for _, child in node.children() if child is not None)
+        return False
+
+    def _guard(self, method):
+        def visit(node):
+            try:
+                result = method(node)
+            except Exception as e:
+                return self._recover(node, e)
+            if type(result) is GeneratorType:
+                return self._guarded(node, result)
+            return result
+        return visit
+
+    def _guarded(self, node, visit):
+        try:
+            return (yield from visit)
+        except Exception as e:
+            return self._recover(node, e)
+
+    def _recover(self, node, error):
+        # Anything else than a SemanticError is a bug, unless it comes from
+        # an operand that has the error type, whose names the checks do
+        # not expect.
+        if not isinstance(error, SemanticError) and not self._erroneous(node):
+            raise error
+        self.report(node, error)
 
     def visit_Program(self, node):
         if self.debug:
@@ -219,64 +518,63 @@ class Visitor(NodeVisitor):
             print(node)
         self.environment.push(node)
         node.symtab = self.environment.get_root()
+        self.node_index = node.node_index
         for _decl in node.gdecls:
-            self.visit(_decl)
+            yield _decl
         self.environment.pop()
         if self.debug:
             print("visit_Program END")
 
     def visit_BinaryOp(self, node):
-        coord = f"{node.coord}"
         if self.debug:
-            print(f"@visit_BinaryOp {coord}")
+            print(f"@visit_BinaryOp {node.coord}")
             print(node)
-        self.visit(node.left)
-        assert node.left.type is not None, f"\"{node.left.name}\" is not defined {coord}"
+        yield node.left
+        if node.left.type is None:
+            raise SemanticError(node.coord, '"{}" is not defined {coord}', node.left.name)
         ltype = node.left.type.names[-1]
-        self.visit(node.right)
-        assert node.right.type is not None, f"\"{node.right.name}\" is not defined {coord}"
+        yield node.right
+        if node.right.type is None:
+            raise SemanticError(node.coord, '"{}" is not defined {coord}', node.right.name)
         rtype = node.right.type.names[-1]
-        assert ltype == rtype, f"Cannot assign \"{rtype}\" to \"{ltype}\" {coord}"
-        if node.op in ltype.binary_ops:
-            node.type = Type([ltype], node.coord)
-        elif node.op in ltype.rel_ops:
-            node.type = Type([self.type_mapping["bool"]], node.coord)
-        else:
-            assert False, f"Assign operator \"{node.op}\" is not supported by \"{ltype}\" {coord}"
+        operation = binary_operation(node.op, ltype, rtype)
+        if operation.error is TypeMismatch:
+            raise SemanticError(node.coord, 'Cannot assign "{}" to "{}" {coord}', rtype, ltype)
+        if operation.error is not None:
+            raise SemanticError(node.coord, 'Assign operator "{}" is not supported by "{}" {coord}', node.op, ltype)
+        node.type = operation.type
         if self.debug:
             print(f"visit_BinaryOp END")
 
     def visit_Assignment(self, node):
-        coord = f"{node.coord}"
         if self.debug:
-            print(f"@visit_Assignment {coord}")
+            print(f"@visit_Assignment {node.coord}")
             print(node)
-        self.visit(node.rvalue)
-        rtype = node.rvalue.type.names
+        yield node.rvalue
+        rtype = node.rvalue.type
         if isinstance(node.rvalue, FuncCall):
             if isinstance(node.rvalue.name.bind, PtrDecl):
-                rtype = node.rvalue.type.names[1:]
+                rtype = intern_type(rtype.names[1:], self.types)
         val = node.lvalue
-        self.visit(val)
-        if isinstance(val, ID):
-            assert val.scope is not None, f"\"{val}\" is not defined {coord}"
-        ltype = node.lvalue.type.names
-        assert ltype == rtype, f"Cannot assign \"{rtype}\" to \"{ltype}\" {coord}"
-        assert node.op in ltype[-1].assign_ops, f"Assign operator \"{node.op}\" not supported by \"{ltype[-1]}\""
+        yield val
+        if isinstance(val, ID) and val.scope is None:
+            raise SemanticError(node.coord, '"{}" is not defined {coord}', val)
+        ltype = node.lvalue.type
+        if ltype is not rtype:
+            raise SemanticError(node.coord, 'Cannot assign "{}" to "{}" {coord}', rtype.names, ltype.names)
+        if assign_operation(node.op, ltype.names[-1]).error is not None:
+            raise SemanticError(node.coord, 'Assign operator "{}" not supported by "{}"', node.op, ltype.names[-1])
         if self.debug:
             print(f"visit_Assignment END")
 
     def visit_Assert(self, node):
-        coord = f"{node.expr.coord}"
         if self.debug:
-            print(f"@visit_Assert {coord}")
+            print(f"@visit_Assert {node.expr.coord}")
             print(node)
         expr = node.expr
-        self.visit(expr)
-        if hasattr(expr, "type"):
-            assert expr.type.names[0] == self.type_mapping["bool"], f"Expression must be boolean {coord}"
-        else:
-            assert False, f"Expression must be boolean {coord}"
+        yield expr
+        if not hasattr(expr, "type") or expr.type.names[0] != self.type_mapping["bool"]:
+            raise SemanticError(expr.coord, 'Expression must be boolean {coord}')
         if self.debug:
             print(f"visit_Assert END")
 
@@ -285,15 +583,14 @@ class Visitor(NodeVisitor):
             print(f"@visit_ArrayRef")
             print(node)
         subsc = node.subscript
-        self.visit(subsc)
-        if isinstance(subsc, ID):
-            coord = f"{subsc.coord}"
-            assert subsc.scope is not None, f"\"{subsc.name}\" is not defined {coord}"
+        yield subsc
+        if isinstance(subsc, ID) and subsc.scope is None:
+            raise SemanticError(subsc.coord, '"{}" is not defined {coord}', subsc.name)
         stype = subsc.type.names[-1]
-        coord = f"{node.coord}"
-        assert stype == IntType, f"\"{stype}\" must be a Int type {coord}"
-        self.visit(node.name)
-        node.type = Type(node.name.type.names[1:], node.coord)
+        if stype != IntType:
+            raise SemanticError(node.coord, '"{}" must be a Int type {coord}', stype)
+        yield node.name
+        node.type = intern_type(node.name.type.names[1:], self.types)
         if self.debug:
             print(f"visit_ArrayRef END")
 
@@ -301,23 +598,23 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_ArrayDecl")
             print(node)
-        self.visit(node.type)
+        yield node.type
         arrayType = node.type
         while not isinstance(arrayType, VarDecl):
             arrayType = arrayType.type
         arrayId = arrayType.declname
         arrayId.type.names.insert(0, self.type_mapping["array"])
         if node.dim is not None:
-            self.visit(node.dim)
+            yield node.dim
         if self.debug:
             print("visit_ArrayDecl END")
 
     def visit_Break(self, node):
-        coord = f"{node.coord}"
         if self.debug:
-            print(f"@visit_Break {coord}")
+            print(f"@visit_Break {node.coord}")
             print(node)
-        assert self.environment.loop_block != [], f"Break statement must be inside a loop block {coord}"
+        if not self.environment.loop_block:
+            raise SemanticError(node.coord, 'Break statement must be inside a loop block {coord}')
         node.bind = self.environment.loop_block[-1]
         if self.debug:
             print(f"visit_Break END")
@@ -326,9 +623,9 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_Cast")
             print(node)
-        self.visit(node.expr)
-        self.visit(node.to_type)
-        node.type = Type(node.to_type.names, node.coord)
+        yield node.expr
+        yield node.to_type
+        node.type = intern_type(node.to_type.names, self.types)
         if self.debug:
             print("visit_Cast END")
 
@@ -337,7 +634,7 @@ class Visitor(NodeVisitor):
             print("@visit_Compound")
             print(node)
         for item in node.block_items:
-            self.visit(item)
+            yield item
         if self.debug:
             print("visit_Compound END")
 
@@ -346,12 +643,17 @@ class Visitor(NodeVisitor):
             print("@visit_Constant")
             print(node)
         if not isinstance(node.type, UCType):
-            consType = self.type_mapping[node.rawtype]
-            node.type = Type([consType], node.coord)
-            if consType.typename == 'int':
-                node.value = int(node.value)
-            elif consType.typename == 'float':
-                node.value = float(node.value)
+            key = (node.rawtype, node.value)
+            constant = self.constants.get(key)
+            if constant is None:
+                consType = self.type_mapping[node.rawtype]
+                value = node.value
+                if consType.typename == 'int':
+                    value = int(value)
+                elif consType.typename == 'float':
+                    value = float(value)
+                constant = self.constants[key] = (intern_type((consType,), self.types), value)
+            node.type, node.value = constant
         if self.debug:
             print("visit_Constant END")
 
@@ -359,17 +661,17 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@setDim")
         if nodeType.dim is None:
-            nodeType.dim = Constant('int', length)
+            self._set_child(nodeType, 'dim', Constant('int', length))
             self.visit_Constant(nodeType.dim)
         else:
-            assert False, f"Size mismatch on \"{var}\" {line}"
+            raise SemanticError(line, 'Size mismatch on "{}" {coord}', var)
         if self.debug:
             print("setDim END")
 
     def checkInit(self, nodeType, init, var, line):
         if self.debug:
             print("@checkInit")
-        self.visit(init)
+        yield init
         if isinstance(init, Constant):
             self.checkConstant(nodeType, init, var, line)
         elif isinstance(init, InitList):
@@ -387,15 +689,17 @@ class Visitor(NodeVisitor):
         length = len(init.exprs)
         exprs = init.exprs
         if isinstance(nodeType, VarDecl):
-            assert length == 1, f"Initialization must be a single element {line}"
-            assert nodeType.type == exprs[0].type, f"Initialization type mismatch {line}"
+            if length != 1:
+                raise SemanticError(line, 'Initialization must be a single element {coord}')
+            if nodeType.type != exprs[0].type:
+                raise SemanticError(line, 'Initialization type mismatch {coord}')
         elif isinstance(nodeType, ArrayDecl):
             size = length
             decl = nodeType
             if isinstance(nodeType.type.declname.bind, ArrayDecl):
                 if nodeType.type.declname.bind.dim is None:
                     size = len(exprs)
-                    nodeType.type.declname.bind.dim = Constant('int', size)
+                    self._set_child(nodeType.type.declname.bind, 'dim', Constant('int', size))
                     self.visit_Constant(nodeType.type.declname.bind.dim)
 
             # while isinstance(nodeType.type, ArrayDecl):
@@ -423,10 +727,12 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@checkConstant")
         if init.rawtype == 'string':
-            assert nodeType.type.type.names == [self.type_mapping["array"],self.type_mapping["char"]], f"Initialization type mismatch {line}"
+            if nodeType.type.type.names != [self.type_mapping["array"], self.type_mapping["char"]]:
+                raise SemanticError(line, 'Initialization type mismatch {coord}')
             self.setDim(nodeType, len(init.value), line, var)
         else:
-            assert nodeType.type.names[0] == init.type.names[0], f"Initialization type mismatch {line}"
+            if nodeType.type.names[0] != init.type.names[0]:
+                raise SemanticError(line, 'Initialization type mismatch {coord}')
         if self.debug:
             print("checkConstant END")
 
@@ -436,7 +742,8 @@ class Visitor(NodeVisitor):
         initId = self.environment.lookup(init.name.name)
         if isinstance(init.subscript, Constant):
             rtype = initId.type.names[1]
-            assert nodeType.type.names[0] == rtype, f"Initialization type mismatch \"{var}\" {line}"
+            if nodeType.type.names[0] != rtype:
+                raise SemanticError(line, 'Initialization type mismatch "{}" {coord}', var)
         if self.debug:
             print("checkArrayRef END")
 
@@ -447,31 +754,33 @@ class Visitor(NodeVisitor):
             idType = nodeType.type
             while not isinstance(idType, VarDecl):
                 idType = idType.type
-            assert idType.type.names == init.type.names, f"Initialization type mismatch {line}"
+            if idType.type.names != init.type.names:
+                raise SemanticError(line, 'Initialization type mismatch {coord}')
             self.setDim(nodeType, init.bind.dim.value, line, var)
         else:
-            assert nodeType.type.names[-1] == init.type.names[-1], f"Initialization type mismatch {line}"
+            if nodeType.type.names[-1] != init.type.names[-1]:
+                raise SemanticError(line, 'Initialization type mismatch {coord}')
         if self.debug:
             print("checkId END")
 
     def visit_Decl(self, node):
-        coord = f"{node.name.coord}"
+        coord = node.name.coord
         if self.debug:
             print(f"@visit_Decl {coord}")
             print(node)
         declType = node.type
-        self.visit(declType)
+        yield declType
         declVar = node.name.name
         node.name.bind = declType
         if isinstance(declType, PtrDecl):
             while isinstance(declType, PtrDecl):
                 declType = declType.type
         if isinstance(declType, FuncDecl):
-            assert self.environment.lookup(declVar) is not None, f"\"{declVar}\" is not defined {coord}"
+            if self.environment.lookup(declVar) is None:
+                raise SemanticError(coord, '"{}" is not defined {coord}', declVar)
         else:
-            assert self.environment.find(declVar) is not None, f"\"{declVar}\" is not defined"
             if node.init is not None:
-                self.checkInit(declType, node.init, declVar, coord)
+                yield from self.checkInit(declType, node.init, declVar, coord)
         if self.debug:
             print(f"visit_Decl END")
 
@@ -480,7 +789,7 @@ class Visitor(NodeVisitor):
             print("@visit_DeclList")
             print(node)
         for decl in node.decls:
-            self.visit(decl)
+            yield decl
             self.environment.funcdef.decls.append(decl)
         if self.debug:
             print("visit_DeclList END")
@@ -496,10 +805,9 @@ class Visitor(NodeVisitor):
             print("@visit_ExprList")
             print(node)
         for expr in node.exprs:
-            self.visit(expr)
-            if isinstance(expr, ID):
-                coord = f"{expr.coord}"
-                assert expr.scope is not None, f"\"{expr.name}\" is not defined {coord}"
+            yield expr
+            if isinstance(expr, ID) and expr.scope is None:
+                self.report(expr, SemanticError(expr.coord, '"{}" is not defined {coord}', expr.name))
         if self.debug:
             print("visit_ExprList END")
 
@@ -510,10 +818,10 @@ class Visitor(NodeVisitor):
         if isinstance(node.init, DeclList):
             self.environment.push(node)
         self.environment.loop_block.append(node)
-        self.visit(node.init)
-        self.visit(node.cond)
-        self.visit(node.next)
-        self.visit(node.stmt)
+        yield node.init
+        yield node.cond
+        yield node.next
+        yield node.stmt
         self.environment.loop_block.pop()
         if isinstance(node.init, DeclList):
             self.environment.pop()
@@ -524,11 +832,13 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_FuncCall")
             print(node)
-        coord = f"{node.coord}"
+        coord = node.coord
         funcLabel = self.environment.lookup(node.name.name)
-        assert funcLabel is not None, f"\"{node.name.name}\" is not defined {coord}"
-        assert funcLabel.kind == "func", f"\"{funcLabel}\" is not a function {coord}"
-        node.type = funcLabel.type
+        if funcLabel is None:
+            raise SemanticError(coord, '"{}" is not defined {coord}', node.name.name)
+        if funcLabel.kind != "func":
+            raise SemanticError(coord, '"{}" is not a function {coord}', funcLabel)
+        node.type = intern_type(funcLabel.type.names, self.types)
         node.name.type = funcLabel.type
         node.name.bind = funcLabel.bind
         node.name.kind = funcLabel.kind
@@ -538,20 +848,23 @@ class Visitor(NodeVisitor):
             while isinstance(sig, PtrDecl):
                 sig = sig.type
             if isinstance(node.args, ExprList):
-                assert len(sig.args.params) == len(node.args.exprs), f"Number of arguments mismatch {coord}"
+                if len(sig.args.params) != len(node.args.exprs):
+                    raise SemanticError(coord, 'Number of arguments mismatch {coord}')
                 for(arg, fpar) in zip(node.args.exprs, sig.args.params):
-                    self.visit(arg)
-                    coord = f"{arg.coord}"
-                    if isinstance(arg, ID):
-                        assert self.environment.find(arg.name), f"\"{arg.name}\" is not defined {coord}"
-                    assert arg.type.names == fpar.type.type.names, f"Type mismatch for \"{fpar.type.declname.name}\" {coord}"
+                    yield arg
+                    if isinstance(arg, ID) and not self.environment.find(arg.name):
+                        raise SemanticError(arg.coord, '"{}" is not defined {coord}', arg.name)
+                    if arg.type.names != fpar.type.type.names:
+                        raise SemanticError(arg.coord, 'Type mismatch for "{}" {coord}', fpar.type.declname.name)
             else:
-                self.visit(node.args)
-                assert len(sig.args.params) == 1, f"Number of arguments mismatch {coord}"
+                yield node.args
+                if len(sig.args.params) != 1:
+                    raise SemanticError(coord, 'Number of arguments mismatch {coord}')
                 argType = sig.args.params[0].type
                 while not isinstance(argType, VarDecl):
                     argType = argType.type
-                assert node.args.type.names == argType.type.names, f"Type mismatch for \"{sig.args.params[0].name.name}\" {coord}"
+                if node.args.type.names != argType.type.names:
+                    raise SemanticError(coord, 'Type mismatch for "{}" {coord}', sig.args.params[0].name.name)
         if self.debug:
             print("visit_FuncCall END")
 
@@ -559,14 +872,14 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_FuncDecl")
             print(node)
-        self.visit(node.type)
+        yield node.type
         func = self.environment.lookup(node.type.declname.name)
         func.kind = 'func'
         func.bind = node.args
         self.environment.push(node)
         if node.args is not None:
             for arg in node.args:
-                self.visit(arg)
+                yield arg
         if self.debug:
             print("visit_FuncDecl END")
 
@@ -576,17 +889,17 @@ class Visitor(NodeVisitor):
             print(node)
         node.decls = []
         self.environment.funcdef = node
-        self.visit(node.spec)
-        self.visit(node.decl)
+        yield node.spec
+        yield node.decl
         if node.param_decls is not None:
             for par in node.param_decls:
-                self.visit(par)
+                yield par
         if node.body is not None:
             for body in node.body:
-                self.visit(body)
+                yield body
         self.environment.pop()
         func = self.environment.lookup(node.decl.name.name)
-        node.spec = func.type
+        self._set_child(node, 'spec', func.type)
         if self.debug:
             print("visit_FuncDef END")
 
@@ -595,7 +908,7 @@ class Visitor(NodeVisitor):
             print("@visit_GlobalDecl")
             print(node)
         for decl in node.decls:
-            self.visit(decl)
+            yield decl
         if self.debug:
             print("visit_GlobalDecl END")
 
@@ -605,7 +918,7 @@ class Visitor(NodeVisitor):
             print(node)
         varId = self.environment.lookup(node.name)
         if varId is not None:
-            node.type = varId.type
+            node.type = varId.type if varId.type is None else intern_type(varId.type.names, self.types)
             node.kind = varId.kind
             node.scope = varId.scope
             node.bind = varId.bind
@@ -613,18 +926,15 @@ class Visitor(NodeVisitor):
             print("visit_ID END")
 
     def visit_If(self, node):
-        coord = f"{node.cond.coord}"
         if self.debug:
             print("@visit_If")
             print(node)
-        self.visit(node.cond)
-        if hasattr(node.cond, 'type'):
-            assert node.cond.type.names[0] == self.type_mapping["bool"], f"The condition must be a boolean type {coord}"
-        else:
-            assert False, f"The condition must be a boolean type {coord}"
-        self.visit(node.iftrue)
+        yield node.cond
+        if not hasattr(node.cond, 'type') or node.cond.type.names[0] != self.type_mapping["bool"]:
+            self.report(node.cond, SemanticError(node.cond.coord, 'The condition must be a boolean type {coord}'))
+        yield node.iftrue
         if node.iffalse is not None:
-            self.visit(node.iffalse)
+            yield node.iffalse
         if self.debug:
             print("visit_If END")
 
@@ -633,10 +943,9 @@ class Visitor(NodeVisitor):
             print("@visit_InitList")
             print(node)
         for expr in node.exprs:
-            self.visit(expr)
-            if not isinstance(expr, InitList):
-                coord = f"{expr.coord}"
-                assert isinstance(expr, Constant), f"Expression must be a Constant {coord}"
+            yield expr
+            if not isinstance(expr, InitList) and not isinstance(expr, Constant):
+                self.report(expr, SemanticError(expr.coord, 'Expression must be a Constant {coord}'))
         if self.debug:
             print("visit_InitList END")
 
@@ -645,7 +954,7 @@ class Visitor(NodeVisitor):
             print("@visit_ParamList")
             print(node)
         for par in node.params:
-            self.visit(par)
+            yield par
         if self.debug:
             print("visit_ParamList END")
 
@@ -656,7 +965,7 @@ class Visitor(NodeVisitor):
         if node.expr is not None:
             if node.expr[0] is not None:
                 for expr in node.expr:
-                    self.visit(expr)
+                    yield expr
         if self.debug:
             print("visit_Print END")
 
@@ -664,7 +973,7 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_PtrDecl")
             print(node)
-        self.visit(node.type)
+        yield node.type
         ptrType = node.type
         while not isinstance(ptrType, VarDecl):
             ptrType = ptrType.type
@@ -676,27 +985,31 @@ class Visitor(NodeVisitor):
     def checkLocation(self, var):
         if self.debug:
             print("@checkLocation")
-        coord = f"{var.coord}"
         test = (isinstance(var, ArrayRef) and len(var.type.names) == 1)
         test = test or isinstance(var, ID)
+        if not test:
+            self.report(var, SemanticError(var.coord, '"{}" is not a simple variable {coord}', self._location_name(var)))
+        elif isinstance(var, ID) and var.scope is None:
+            self.report(var, SemanticError(var.coord, '"{}" is not defined {coord}', self._location_name(var)))
+        elif len(var.type.names) != 1:
+            self.report(var, SemanticError(var.coord, 'Type of "{}" is not a primitive type', self._location_name(var)))
+        if self.debug:
+            print("checkLocation END")
+
+    def _location_name(self, var):
         name = var.name
         if isinstance(name, ArrayRef):
             name = name.name.name + f"[{name.subscript.name}][{var.subscript.name}]"
         elif hasattr(var, 'subscript'):
             name = name.name + f"[{var.subscript.name}]"
-        assert test, f"\"{name}\" is not a simple variable {coord}"
-        if isinstance(var, ID):
-            assert var.scope is not None, f"\"{name}\" is not defined {coord}"
-        assert len(var.type.names) == 1, f"Type of \"{name}\" is not a primitive type"
-        if self.debug:
-            print("checkLocation END")
+        return name
 
     def visit_Read(self, node):
         if self.debug:
             print("@visit_Read")
             print(node)
         for loc in node.names:
-            self.visit(loc)
+            yield loc
             if isinstance(loc, ID) or isinstance(loc, ArrayRef):
                 self.checkLocation(loc)
             elif isinstance(loc, ExprList):
@@ -704,11 +1017,9 @@ class Visitor(NodeVisitor):
                     if isinstance(var, ID) or isinstance(var, ArrayRef):
                         self.checkLocation(var)
                     else:
-                        coord = f"{var.coord}"
-                        assert False, f"\"{var}\" is not a variable {coord}"
+                        self.report(var, SemanticError(var.coord, '"{}" is not a variable {coord}', var))
             else:
-                coord = f"{loc.coord}"
-                assert False, f"\"{loc}\" is not a variable {coord}"
+                self.report(loc, SemanticError(loc.coord, '"{}" is not a variable {coord}', loc))
         if self.debug:
             print("visit_Read END")
 
@@ -717,13 +1028,14 @@ class Visitor(NodeVisitor):
             print("@visit_Return")
             print(node)
         if node.expr is not None:
-            self.visit(node.expr)
+            yield node.expr
             returnType = node.expr.type.names
         else:
             returnType = [self.type_mapping['void']]
         rtype = self.environment.loop_type
-        coord = f"{node.coord}"
-        assert returnType == rtype, f"Return type \"{returnType[-1].__str__()}\" is not compatible with \"{rtype[-1].__str__()}\" {coord}"
+        if returnType != rtype:
+            raise SemanticError(node.coord, 'Return type "{}" is not compatible with "{}" {coord}',
+                                returnType[-1], rtype[-1])
         if self.debug:
             print("visit_Return END")
 
@@ -742,13 +1054,16 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_VarDecl")
             print(node)
-        self.visit(node.type)
+        yield node.type
         var = node.declname
-        self.visit(var)
+        yield var
         if isinstance(var, ID):
-            coord = f"{var.coord}"
-            assert not self.environment.find(var.name), f"\"{var.name}\" already defined in this scope {coord}"
-            self.environment.set_local(var, 'var')
+            # The error is reported at the declaration: the identifier keeps
+            # the declared type, which ArrayDecl and PtrDecl complete.
+            if self.environment.find(var.name):
+                self.report(node, SemanticError(var.coord, '"{}" already defined in this scope {coord}', var.name))
+            else:
+                self.environment.set_local(var, 'var')
             var.type = node.type
         if self.debug:
             print("visit_VarDecl END")
@@ -757,15 +1072,16 @@ class Visitor(NodeVisitor):
         if self.debug:
             print("@visit_UnaryOp")
             print(node)
-        self.visit(node.expr)
+        yield node.expr
         unaryType = node.expr.type.names[-1]
-        coord = f"{node.coord}"
-        assert node.op in unaryType.unary_ops, f"Unary operator \"{node.op}\" not supported {coord}"
-        node.type = Type(names=list(node.expr.type.names), coord=node.coord)
+        if unary_operation(node.op, unaryType).error is not None:
+            raise SemanticError(node.coord, 'Unary operator "{}" not supported {coord}', node.op)
+        names = list(node.expr.type.names)
         if node.op == "*":
-            node.type.names.pop(0)
+            names.pop(0)
         elif node.op == "&":
-            node.type.names.insert(0, self.type_mapping["ptr"])
+            names.insert(0, self.type_mapping["ptr"])
+        node.type = intern_type(names, self.types)
         if self.debug:
             print("visit_UnaryOp END")
 
@@ -774,12 +1090,12 @@ class Visitor(NodeVisitor):
             print("@visit_While")
             print(node)
         self.environment.loop_block.append(node)
-        self.visit(node.cond)
+        yield node.cond
         ctype = node.cond.type.names[0]
-        coord = f"{node.coord}"
-        assert ctype == BoolType, f"Conditional expression must be a Boolean type {coord}"
+        if ctype != BoolType:
+            self.report(node.cond, SemanticError(node.coord, 'Conditional expression must be a Boolean type {coord}'))
         if node.stmt is not None:
-            self.visit(node.stmt)
+            yield node.stmt
         self.environment.loop_block.pop()
         if self.debug:
             print("visit_While END")